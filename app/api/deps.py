@@ -1,4 +1,6 @@
-from collections.abc import Generator
+import logging
+import time
+from collections.abc import AsyncGenerator
 from typing import Annotated
 import redis.asyncio as redis
 
@@ -7,34 +9,69 @@ from fastapi import Cookie, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jwt.exceptions import InvalidTokenError
 from pydantic import ValidationError
-from sqlmodel import Session
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 from app.core import security
+from app.core.cache import TTLCache
 from app.core.config import settings
-from app.core.db import engine
+from app.core.db import async_session_maker
 from app.models import LDAPUser, TokenPayload, User
 from fastapi.security import APIKeyCookie
 
+logger = logging.getLogger(__name__)
+
 reusable_oauth2 = OAuth2PasswordBearer(
     tokenUrl=f"{settings.API_V1_STR}/login/access-token"
 )
 
 
-def get_db() -> Generator[Session, None, None]:
-    with Session(engine) as session:
+async def get_db() -> AsyncGenerator[AsyncSession, None]:
+    async with async_session_maker() as session:
         yield session
 
 
-SessionDep = Annotated[Session, Depends(get_db)]
+SessionDep = Annotated[AsyncSession, Depends(get_db)]
 TokenDep = Annotated[str, Depends(reusable_oauth2)]
 
 cookie_scheme = APIKeyCookie(name="access_token")
 CookieDep = Annotated[str, Depends(cookie_scheme)]
 
 
-def get_current_user(access_token: CookieDep) -> LDAPUser:
+# token fingerprint -> verified user, each entry expiring with its token
+token_cache: TTLCache[LDAPUser] = TTLCache(
+    maxsize=settings.TOKEN_CACHE_SIZE,
+    ttl=settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60,
+)
+
+
+async def token_revoked(fingerprint: str) -> bool:
+    """Revocation check with an explicit policy for when Redis can't answer"""
     try:
+        return await security.is_token_revoked(fingerprint)
+    except Exception as e:
+        logger.error(f"Token revocation lookup failed: {e}")
+        if settings.TOKEN_REVOCATION_FAIL_OPEN:
+            return False
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Could not check credentials, try again later",
+        )
+
 
+async def get_current_user(access_token: CookieDep) -> LDAPUser:
+    fingerprint = security.token_fingerprint(access_token)
+    if settings.TOKEN_REVOCATION_ENABLED and await token_revoked(fingerprint):
+        token_cache.pop(fingerprint)
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Could not validate credentials",
+        )
+
+    cached_user = token_cache.get(fingerprint)
+    if cached_user is not None:
+        return cached_user
+
+    try:
         payload = jwt.decode(
             access_token, settings.SECRET_KEY, algorithms=[security.ALGORITHM]
         )
@@ -48,6 +85,9 @@ def get_current_user(access_token: CookieDep) -> LDAPUser:
         if not token_data:
             raise HTTPException(status_code=404, detail="User not found")
 
+        remaining = payload.get("exp", 0) - time.time()
+        if remaining > 0:
+            token_cache.set(fingerprint, token_data, ttl=remaining)
         return token_data
     except (InvalidTokenError, ValidationError):
         raise HTTPException(
@@ -1,79 +1,40 @@
-from datetime import datetime, timedelta
+import logging
 
 from fastapi import APIRouter
+from fastapi.responses import JSONResponse
 
 from app.api.routes.analysis.schema import AnalysisRequest
-from src.main import BaseDep, agent
+from app.services.analysis_jobs import AnalysisQueueFull, analysis_jobs
 
 router = APIRouter(prefix="/analysis", tags=["Analysis Endpoint"])
+logger = logging.getLogger(__name__)
 
 
 @router.post("/")
 async def analyse_website_ux(inputs: AnalysisRequest):
+    """
+    Queue a UX analysis and return its job at once. Progress is published on
+    the job's WebSocket topic ("analysis:<job id>"); the result is read back
+    from GET /analysis/<job id>. Submitting the same URL and prompt again
+    returns the existing job.
+    """
     try:
-        username = "standard_user"
-        password = "secret_sauce"
-        cdp_endpoint = "http://localhost:9222"
-
-        # start time
-        start_time = datetime.now()
-        _deps_for_agent = BaseDep(
-            url=inputs.url_to_analyse or "https://www.saucedemo.com",
-            username=username,
-            password=password,
-            cdp_endpoint=cdp_endpoint,
-            visited_urls=[],
-            ux_report=[],
-            user_journey=[],
-            positive_stuff=[],
-            expectations=[],
-        )
-        result = await agent.run(
-            f"""Go to {inputs.url_to_analyse} and start the analysis of the website. FYI: {inputs.prompt}""",
-            deps=_deps_for_agent,
-        )
-        _deps_for_agent.visited_urls.extend(result.output.visited_urls)
+        job = await analysis_jobs.submit(inputs.url_to_analyse, inputs.prompt)
+        return JSONResponse(job, status_code=202)
+    except AnalysisQueueFull as e:
+        return JSONResponse({"error": str(e)}, status_code=503)
+    except Exception as e:
+        logger.error(e)
+        return JSONResponse({"error": str(e)}, status_code=500)
 
-        while True:
-            if result.output.should_continue:
-                print("Continuing to next page...")
-                result = await agent.run(
-                    f"""Go to {result.output.next_url} and continue the analysis. 
-                    Current progress: {result.output.current_purchase_flow_number}/{result.output.total_purchase_flows} purchase flows completed. 
-                    Visited URLs so far: {', '.join(_deps_for_agent.visited_urls)}.""",
-                    deps=BaseDep(
-                        url=result.output.next_url
-                        or inputs.url_to_analyse
-                        or "https://www.saucedemo.com",
-                        username=username,
-                        password=password,
-                        cdp_endpoint=cdp_endpoint,
-                    ),
-                    message_history=result.all_messages(),
-                )
-                _deps_for_agent.visited_urls.extend(result.output.visited_urls)
 
-            else:
-                print("Analysis complete.")
-                break
-            # timeout after 2 minutes
-            if datetime.now() - start_time > timedelta(minutes=2):
-                print("Timeout reached, stopping analysis.")
-                break
-        print(result)
-        print("Final UX Report:")
-        print("Visited URLs:", set(_deps_for_agent.visited_urls))
-        print("UX Reports:", _deps_for_agent.ux_report)
-        print("User Journeys:", _deps_for_agent.user_journey)
-        print("Expectation Gaps:", _deps_for_agent.expectations)
-        print("Positive UX Elements:", _deps_for_agent.positive_stuff)
-        return {
-            "visited_urls": set(_deps_for_agent.visited_urls),
-            "ux_report": _deps_for_agent.ux_report,
-            "user_journey": _deps_for_agent.user_journey,
-            "expectations": _deps_for_agent.expectations,
-            "positive_stuff": _deps_for_agent.positive_stuff,
-            "final_result": result,
-        }
+@router.get("/{job_id}")
+async def get_analysis(job_id: str):
+    try:
+        job = await analysis_jobs.get(job_id)
     except Exception as e:
-        return {"error": str(e)}
+        logger.error(e)
+        return JSONResponse({"error": str(e)}, status_code=500)
+    if job is None:
+        return JSONResponse({"error": "Analysis job not found"}, status_code=404)
+    return JSONResponse(job)
@@ -11,6 +11,7 @@ from app.core.config import settings
 from app.services.cavecad.main import create_and_dump_csv, fetch_cavecad_data
 from app.services.cavecad.schema import CavecadSubmitElement
 from app.services.cavecad.submission import save_submitted_results
+from app.services.stats import refresh_stats_view
 from asyncer import asyncify
 
 router = APIRouter(prefix="/cavecad", tags=["Cavecad CSV"])
@@ -27,6 +28,7 @@ async def POST(input: CavecadSubmitElement, current_user: CurrentUser):
         for each_record in input.data:
             _data = await save_submitted_results(each_record, current_user)
             data.append(_data)
+        await refresh_stats_view()
         # return drawpoints
 
         records = [
@@ -1,8 +1,11 @@
 import logging
 import os
+from typing import Annotated
+
 from fastapi import (
     APIRouter,
     HTTPException,
+    Query,
     UploadFile,
 )
 from fastapi.responses import JSONResponse
@@ -12,16 +15,16 @@ from app.core.pagination import Paginated
 from app.core.config import settings
 
 from app.services.images import get_all_images, delete_image as del_img_service
+from app.services.schema import ImageFilter
 
 router = APIRouter(prefix="/images", tags=["Getting Image Results"])
 logger = logging.getLogger(__name__)
 
 
 @router.get("/")
-async def get(pagination: Paginated):
+async def get(pagination: Paginated, filters: Annotated[ImageFilter, Query()]):
     try:
-
-        results = await get_all_images(pagination)
+        results = await get_all_images(pagination, filters)
         return JSONResponse({"results": results})
 
     except Exception as e:
@@ -34,7 +37,6 @@ async def upload_images(files: list[UploadFile]):
     try:
         saved_files = []
         for file in files:
-
             drawpoint_name, _ = (
                 file.filename.split("_", 1) if file.filename else "XXXXX"
             )
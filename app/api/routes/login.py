@@ -6,10 +6,10 @@ from fastapi import APIRouter, Cookie, Depends, HTTPException, Response
 from fastapi.responses import JSONResponse
 from fastapi.security import OAuth2PasswordRequestForm
 
-from app.api.deps import CookieDep, CurrentUser, SessionDep
+from app.api.deps import CookieDep, CurrentUser, SessionDep, token_cache
 from app.core import security
 from app.core.config import settings
-from app.core.ldap import authenticate_ldap
+from app.core.ldap import authenticate_ldap_async
 from app.models import LDAPUser, Token, UserPublic
 import re
 
@@ -17,7 +17,7 @@ router = APIRouter(tags=["login"])
 
 
 @router.post("/login/access-token")
-def login_access_token(
+async def login_access_token(
     form_data: Annotated[OAuth2PasswordRequestForm, Depends()], response: Response
 ) -> dict[str, Any]:
     """
@@ -27,19 +27,17 @@ def login_access_token(
     username = re.sub(r"@riotinto\.com", "", username, flags=re.IGNORECASE)
     password = form_data.password.strip()
 
-    user, detail = authenticate_ldap(username, password)
+    user, detail = await authenticate_ldap_async(username, password)
 
     if not user:
         raise HTTPException(status_code=400, detail=detail)
 
     access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     human_readable_data = LDAPUser(
-        **{
-            "name": user.get("attributes").get("displayName")[0],
-            "title": user.get("attributes").get("title")[0],
-            "username": user.get("attributes").get("mailNickname")[0],
-            "id": user.get("dn"),
-        }
+        name=user.display_name,
+        title=user.title,
+        username=user.username,
+        id=user.dn,
     )
 
     _token = security.create_access_token(
@@ -61,7 +59,13 @@ def login_access_token(
 
 
 @router.get("/logout")
-def kill_cookie(response: Response):
+async def kill_cookie(
+    response: Response, access_token: Annotated[str | None, Cookie()] = None
+):
+    if access_token:
+        token_cache.pop(security.token_fingerprint(access_token))
+        if settings.TOKEN_REVOCATION_ENABLED:
+            await security.revoke_token(access_token)
     response.delete_cookie(key=settings.TOKEN_KEY)
     return {"suxess": True}
 
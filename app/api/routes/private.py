@@ -1,13 +1,21 @@
+import uuid
 from typing import Any
 
-from fastapi import APIRouter
+from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 
+from app import crud
 from app.api.deps import SessionDep
-from app.core.security import get_password_hash
+from app.core.security import get_password_hash_async
 from app.models import (
+    ItemsBulkCreate,
+    ItemsPublic,
+    Message,
     User,
     UserPublic,
+    UsersBulkCreate,
+    UsersBulkUpdate,
+    UsersPublic,
 )
 
 router = APIRouter(tags=["private"], prefix="/private")
@@ -21,7 +29,7 @@ class PrivateUserCreate(BaseModel):
 
 
 @router.post("/users/", response_model=UserPublic)
-def create_user(user_in: PrivateUserCreate, session: SessionDep) -> Any:
+async def create_user(user_in: PrivateUserCreate, session: SessionDep) -> Any:
     """
     Create a new user.
     """
@@ -29,10 +37,47 @@ def create_user(user_in: PrivateUserCreate, session: SessionDep) -> Any:
     user = User(
         email=user_in.email,
         full_name=user_in.full_name,
-        hashed_password=get_password_hash(user_in.password),
+        hashed_password=await get_password_hash_async(user_in.password),
     )
 
     session.add(user)
-    session.commit()
+    await session.commit()
 
     return user
+
+
+@router.post("/users/bulk", response_model=UsersPublic)
+async def create_users_bulk(users_in: UsersBulkCreate, session: SessionDep) -> Any:
+    """
+    Create many users in one statement, e.g. from an HR import.
+    """
+    users = await crud.create_users_bulk(session=session, users_create=users_in.data)
+    return UsersPublic(data=users, count=len(users))
+
+
+@router.patch("/users/bulk", response_model=Message)
+async def update_users_bulk(users_in: UsersBulkUpdate, session: SessionDep) -> Any:
+    """
+    Update many users by id in one round trip. Unknown ids fail the whole batch.
+    """
+    try:
+        updated = await crud.update_users_bulk(session=session, users_in=users_in.data)
+    except crud.UsersNotFound as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    return Message(message=f"Updated {updated} users")
+
+
+@router.post("/users/{user_id}/items/bulk", response_model=ItemsPublic)
+async def create_items_bulk(
+    user_id: uuid.UUID, items_in: ItemsBulkCreate, session: SessionDep
+) -> Any:
+    """
+    Create many items for one owner in one statement.
+    """
+    try:
+        items = await crud.create_items_bulk(
+            session=session, items_in=items_in.data, owner_id=user_id
+        )
+    except crud.UsersNotFound as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    return ItemsPublic(data=items, count=len(items))
@@ -0,0 +1,24 @@
+import logging
+from typing import Annotated
+
+from fastapi import (
+    APIRouter,
+    Depends,
+)
+from fastapi.responses import JSONResponse
+
+from app.services.schema import StatsFilter
+from app.services.stats import get_fragmentation_stats
+
+router = APIRouter(prefix="/stats", tags=["Fragmentation statistics"])
+logger = logging.getLogger(__name__)
+
+
+@router.get("/")
+async def get(filters: Annotated[StatsFilter, Depends()]) -> JSONResponse:
+    try:
+        results = await get_fragmentation_stats(filters)
+        return JSONResponse({"results": results})
+    except Exception as e:
+        logger.error(e)
+        return JSONResponse("ERROR", status_code=500)
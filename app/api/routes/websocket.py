@@ -4,65 +4,109 @@ from typing import Annotated
 from unittest.mock import Base
 
 from bs4 import BeautifulSoup
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect
+from fastapi import APIRouter, HTTPException, WebSocket, WebSocketDisconnect
 from pydantic import BaseModel, Field
 from pydantic_ai import Agent
 from pydantic_ai.mcp import MCPServerStreamableHTTP
 
-from app.core.config import settings
-from app.core.redis import get_redis_client
-from app.core.ws import websocket_conn_man
+from app.core.redis import redis_manager
+from app.core.ws import DEFAULT_TOPIC, websocket_conn_man
 
 router = APIRouter(prefix="/ws", tags=["Websocket"])
 
+CHAT_TOPIC = "chat"
 
-@router.websocket("/")
-async def websocket_endpoint(websocket: WebSocket):
+
+def requested_topics(websocket: WebSocket) -> set[str] | None:
+    """Topics passed as ?topics=a,b on the handshake, None for the default"""
+    raw = websocket.query_params.get("topics")
+    if not raw:
+        return None
+    topics = {topic.strip() for topic in raw.split(",") if topic.strip()}
+    return topics or None
+
+
+async def serve_connection(websocket: WebSocket):
     user_id = str(uuid.uuid4())
     try:
-        await websocket_conn_man.connect(websocket, user_id)
+        await websocket_conn_man.connect(
+            websocket,
+            user_id,
+            topics=requested_topics(websocket),
+            last_event_id=websocket.query_params.get("last_event_id"),
+        )
 
         while True:
             data = await websocket.receive_text()
-            await websocket_conn_man.broadcast(f"Client #{user_id} says: {data}")
+            websocket_conn_man.touch(user_id)
+            if not websocket_conn_man.allow_message(user_id):
+                continue
+            if await websocket_conn_man.handle_control(user_id, data):
+                continue
+            await websocket_conn_man.publish(
+                CHAT_TOPIC, f"Client #{user_id} says: {data}"
+            )
 
     except WebSocketDisconnect:
         print(f"User disconnected: {user_id}")
-        websocket_conn_man.disconnect(user_id)
+        await websocket_conn_man.disconnect(user_id)
     except Exception as e:
         print(f"Error in websocket connection for {user_id}: {e}")
-        websocket_conn_man.disconnect(user_id)
+        await websocket_conn_man.disconnect(user_id)
 
 
-@router.websocket("/test")
-async def websocket_endpoint_test(websocket: WebSocket):
-    user_id = str(uuid.uuid4())
-    try:
-        await websocket_conn_man.connect(websocket, user_id)
+@router.websocket("/")
+async def websocket_endpoint(websocket: WebSocket):
+    await serve_connection(websocket)
 
-        while True:
-            data = await websocket.receive_text()
-            await websocket_conn_man.broadcast(f"Client #{user_id} says: {data}")
 
-    except WebSocketDisconnect:
-        print(f"User disconnected: {user_id}")
-        websocket_conn_man.disconnect(user_id)
-    except Exception as e:
-        print(f"Error in websocket connection for {user_id}: {e}")
-        websocket_conn_man.disconnect(user_id)
+@router.websocket("/test")
+async def websocket_endpoint_test(websocket: WebSocket):
+    await serve_connection(websocket)
 
 
 @router.get("/all-connections")
 async def get_all_connections():
-    connections = websocket_conn_man.active_connections.copy()
-    return {"connections": list(connections.keys())}
+    connections = await websocket_conn_man.cluster_connections()
+    workers: dict[str, int] = {}
+    for worker_id in connections.values():
+        workers[worker_id] = workers.get(worker_id, 0) + 1
+    topics = {
+        topic: len(subscribers)
+        for topic, subscribers in websocket_conn_man.topic_connections.items()
+    }
+    return {
+        "connections": list(connections.keys()),
+        "workers": workers,
+        "worker_id": websocket_conn_man.worker_id,
+        "topics": topics,
+    }
+
+
+@router.get("/stats")
+async def get_connection_stats():
+    return {
+        **websocket_conn_man.connection_stats(),
+        "redis_pools": redis_manager.pool_stats(),
+    }
+
+
+class DirectMessage(BaseModel):
+    message: str
+
+
+@router.post("/connections/{connection_id}")
+async def send_to_connection(connection_id: str, body: DirectMessage):
+    delivered = await websocket_conn_man.send_to_connection(connection_id, body.message)
+    if not delivered:
+        raise HTTPException(status_code=404, detail="Connection not found")
+    return {"connection_id": connection_id, "message": body.message}
 
 
 @router.get("/publish-test/{message}")
-async def publish_test(message: str):
-    redis_client = get_redis_client()
-    response = await redis_client.publish(settings.SUBSCRIBED_CHANNEL, message)
-    return {"message": message}
+async def publish_test(message: str, topic: str = DEFAULT_TOPIC):
+    await websocket_conn_man.publish(topic, message)
+    return {"message": message, "topic": topic}
 
 
 class TestOutput(BaseModel):
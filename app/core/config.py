@@ -1,5 +1,6 @@
 import secrets
 import warnings
+from functools import cached_property
 from typing import Annotated, Any, Literal
 
 from pydantic import (
@@ -49,9 +50,43 @@ class Settings(BaseSettings):
         "CN=OT_FileShare_T&IP_UG Geosciences_Geotechnical_RW,OU=OT PowerScale,OU=Folder Permissions,OU=Rights,OU=MN-Oyu_Tolgoi,OU=APAC,OU=PROD,DC=corp,DC=riotinto,DC=org",
     ]
 
+    @cached_property
+    def LDAP_ALLOWED_GROUPS(self) -> frozenset[str]:
+        """LDAP_ALLOWED_GROUP casefolded and frozen once, for O(1) membership checks"""
+        groups = self.LDAP_ALLOWED_GROUP
+        if isinstance(groups, str):
+            groups = [groups]
+        return frozenset(group.casefold() for group in groups)
+
+    # Optional service account for user searches; without it the user's own bind is used
+    LDAP_SERVICE_USER: str | None = None
+    LDAP_SERVICE_PASSWORD: str | None = None
+    LDAP_POOL_SIZE: int = 4
+    LDAP_TIMEOUT: int = 10
+    # Cached user entries (incl. memberOf) and negative caching of failed binds
+    LDAP_CACHE_SIZE: int = 1024
+    LDAP_CACHE_TTL: int = 300
+    LDAP_FAILED_BIND_TTL: int = 60
+    LDAP_MAX_FAILED_LOGINS: int = 5
+    LDAP_FAILED_LOGIN_WINDOW: int = 300
+
     # 60 minutes * 24 hours * 8 days = 8 days
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60 * 24 * 8
     TOKEN_KEY: str = "access_token"
+    # Decoded tokens are cached until their exp; revocation adds a Redis lookup per request
+    TOKEN_CACHE_SIZE: int = 4096
+    TOKEN_REVOCATION_ENABLED: bool = False
+    TOKEN_REVOCATION_PREFIX: str = "auth:revoked"
+    # When the revocation lookup itself fails (Redis down): True lets the token
+    # through unchecked, False rejects the request with 503
+    TOKEN_REVOCATION_FAIL_OPEN: bool = False
+    # bcrypt is CPU-bound; hashing and verification run on this many worker processes
+    PASSWORD_HASH_WORKERS: int = 2
+    # Hashes waiting for a worker; further requests wait instead of piling up in the pool
+    PASSWORD_HASH_MAX_PENDING: int = 64
+    # bcrypt work factor; crud.authenticate_async rehashes other costs on a
+    # successful local-password login (no route uses it yet, /login is LDAP)
+    BCRYPT_ROUNDS: int = 12
     FRONTEND_HOST: str = "http://localhost:5173"
     ENVIRONMENT: Literal["local", "staging", "production"] = "local"
 
@@ -75,6 +110,18 @@ class Settings(BaseSettings):
             path=self.POSTGRES_DB,
         )  # type: ignore
 
+    @computed_field  # type: ignore[prop-decorator]
+    @property
+    def SQLALCHEMY_ASYNC_DATABASE_URI(self) -> PostgresDsn:
+        return MultiHostUrl.build(
+            scheme="postgresql+asyncpg",
+            username=self.POSTGRES_USER,
+            password=self.POSTGRES_PASSWORD,
+            host=self.POSTGRES_SERVER,
+            port=self.POSTGRES_PORT,
+            path=self.POSTGRES_DB,
+        )  # type: ignore
+
     @computed_field
     @property
     def ASYNCPG_URL(self) -> PostgresDsn:
@@ -129,7 +176,45 @@ class Settings(BaseSettings):
     UAT_MONITORED_DP_DATA: str = "/app/static/csv/dp_data"
     UAT_MONITORED_FRAGMENTATION: str = "/app/static/csv/fragmentation"
     UAT_WATER_MONITORING: str = "/app/static/csv/water_monitoring"
+    # Serve /stats from the fragmentation_stats_daily materialised view, refreshed
+    # after each cavecad submission, instead of aggregating the images per request
+    STATS_MATERIALIZED_VIEW: bool = False
     SUBSCRIBED_CHANNEL: str = "JOB_CHANNEL"
+    # Cluster-wide WebSocket presence, refreshed by every worker's heartbeat
+    WS_PRESENCE_PREFIX: str = "ws:presence"
+    WS_PRESENCE_TTL: int = 30
+    WS_PRESENCE_HEARTBEAT: int = 10
+    # Bounded Redis Stream backing the jobs topic so reconnecting clients can resume
+    WS_REPLAY_MAXLEN: int = 1000
+    WS_REPLAY_BLOCK_MS: int = 5000
+    # Keepalive, reaping and backpressure for individual sockets
+    WS_PING_INTERVAL: int = 20
+    # Sockets silent for this long are closed. Off by default: listen-only
+    # clients never send anything, so only enable it once clients answer the
+    # ping frame with {"action": "pong"}
+    WS_IDLE_TIMEOUT: int | None = None
+    WS_SEND_TIMEOUT: float = 5.0
+    WS_RATE_LIMIT: float = 5.0
+    WS_RATE_BURST: int = 20
+    # Redis listener batching and reconnect backoff (seconds)
+    WS_LISTENER_BATCH_SIZE: int = 100
+    WS_LISTENER_BACKOFF_MIN: float = 0.5
+    WS_LISTENER_BACKOFF_MAX: float = 30.0
+    # Background UX analysis jobs: agent loops run at once per API worker, how
+    # many may wait, the per-job time limit (seconds) and how long job records
+    # and results are kept in Redis
+    ANALYSIS_MAX_CONCURRENT_JOBS: int = 2
+    ANALYSIS_MAX_QUEUED_JOBS: int = 20
+    ANALYSIS_JOB_TIMEOUT: int = 120
+    # The timeout above is only checked between steps; a job still running this
+    # much later is cancelled and keeps the findings it had so far
+    ANALYSIS_JOB_GRACE: int = 60
+    ANALYSIS_JOB_TTL: int = 60 * 60 * 24
+    ANALYSIS_JOB_PREFIX: str = "analysis:job"
+    # Queued and running jobs hold a lease their API worker keeps refreshing;
+    # one whose lease lapsed (the worker died) is rerun on the next submit
+    ANALYSIS_JOB_LEASE_TTL: int = 30
+    ANALYSIS_JOB_HEARTBEAT: int = 10
 
     @computed_field
     @property
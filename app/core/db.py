@@ -1,4 +1,6 @@
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlmodel import Session, create_engine, select
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 from app import crud
 from app.core.config import settings
@@ -8,8 +10,160 @@ import logging
 
 logger = logging.getLogger(__name__)
 
+# Sync engine for alembic, prestart checks and initial data scripts
 engine = create_engine(str(settings.SQLALCHEMY_DATABASE_URI))
 
+# Async engine (asyncpg) used by request handlers so queries never block the event loop
+async_engine = create_async_engine(
+    str(settings.SQLALCHEMY_ASYNC_DATABASE_URI),
+    pool_size=10,
+    max_overflow=5,
+    pool_pre_ping=True,
+)
+async_session_maker = async_sessionmaker(
+    async_engine, class_=AsyncSession, expire_on_commit=False
+)
+
+
+# effective_fragmentation holds one row per image with the approved values
+# already applied (what the old LEFT JOIN + COALESCE listing queries computed on
+# every request). Triggers on both source tables keep it in sync, so the
+# submission path and any external writer update it without extra code.
+EFFECTIVE_FRAGMENTATION_COLUMNS = """
+    id,
+    drawpoint_name,
+    approved_drawpoint_name,
+    created_date,
+    fine_area,
+    small_area,
+    medium_area,
+    large_area,
+    oversized_area,
+    raw_image_path,
+    predicted_image_path,
+    bbox_image_path,
+    wetness,
+    dp_condition,
+    drawpointconditioncomment,
+    fragmentationcomment,
+    wetnesscomment,
+    is_edited,
+    image_status,
+    has_bund,
+    imagetaken_date,
+    username
+"""
+
+# latest approval wins should an image ever have more than one
+EFFECTIVE_FRAGMENTATION_SELECT = """
+    SELECT DISTINCT ON (r.id)
+        r.id,
+        COALESCE(r.edited_dp_name, r.drawpoint_name),
+        COALESCE(r.edited_dp_name, f.drawpoint_name),
+        r.created_date,
+        COALESCE(f.new_fine_area, r.fine_area),
+        COALESCE(f.new_small_area, r.small_area),
+        COALESCE(f.new_medium_area, r.medium_area),
+        COALESCE(f.new_large_area, r.large_area),
+        COALESCE(f.new_oversized_area, r.oversized_area),
+        r.raw_image_path,
+        r.predicted_image_path,
+        COALESCE(r.bbox_image_path, r.raw_image_path),
+        f.wetness,
+        f.dp_condition,
+        f.drawpointconditioncomment,
+        f.fragmentationcomment,
+        f.wetnesscomment,
+        r.is_edited,
+        r.image_status,
+        r.has_bund,
+        r.imagetaken_date,
+        COALESCE(f.username, '')
+    FROM fragmentation_images r
+    LEFT JOIN approved_fragmentation f ON r.id = f.image_id
+    {where}
+    ORDER BY r.id, f.id DESC
+"""
+
+EFFECTIVE_FRAGMENTATION_SYNC = f"""
+    CREATE OR REPLACE FUNCTION refresh_effective_fragmentation(target_id INT)
+    RETURNS void AS $$
+    BEGIN
+        INSERT INTO effective_fragmentation ({EFFECTIVE_FRAGMENTATION_COLUMNS})
+        {EFFECTIVE_FRAGMENTATION_SELECT.format(where="WHERE r.id = target_id")}
+        ON CONFLICT (id) DO UPDATE SET
+            drawpoint_name = EXCLUDED.drawpoint_name,
+            approved_drawpoint_name = EXCLUDED.approved_drawpoint_name,
+            created_date = EXCLUDED.created_date,
+            fine_area = EXCLUDED.fine_area,
+            small_area = EXCLUDED.small_area,
+            medium_area = EXCLUDED.medium_area,
+            large_area = EXCLUDED.large_area,
+            oversized_area = EXCLUDED.oversized_area,
+            raw_image_path = EXCLUDED.raw_image_path,
+            predicted_image_path = EXCLUDED.predicted_image_path,
+            bbox_image_path = EXCLUDED.bbox_image_path,
+            wetness = EXCLUDED.wetness,
+            dp_condition = EXCLUDED.dp_condition,
+            drawpointconditioncomment = EXCLUDED.drawpointconditioncomment,
+            fragmentationcomment = EXCLUDED.fragmentationcomment,
+            wetnesscomment = EXCLUDED.wetnesscomment,
+            is_edited = EXCLUDED.is_edited,
+            image_status = EXCLUDED.image_status,
+            has_bund = EXCLUDED.has_bund,
+            imagetaken_date = EXCLUDED.imagetaken_date,
+            username = EXCLUDED.username;
+
+        -- image is gone, so is its effective row
+        IF NOT FOUND THEN
+            DELETE FROM effective_fragmentation WHERE id = target_id;
+        END IF;
+    END;
+    $$ LANGUAGE plpgsql;
+
+    CREATE OR REPLACE FUNCTION sync_effective_from_images()
+    RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP <> 'INSERT' THEN
+            PERFORM refresh_effective_fragmentation(OLD.id);
+        END IF;
+        IF TG_OP = 'INSERT' OR (TG_OP = 'UPDATE' AND NEW.id IS DISTINCT FROM OLD.id) THEN
+            PERFORM refresh_effective_fragmentation(NEW.id);
+        END IF;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+
+    CREATE OR REPLACE FUNCTION sync_effective_from_approved()
+    RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP <> 'INSERT' THEN
+            PERFORM refresh_effective_fragmentation(OLD.image_id);
+        END IF;
+        IF TG_OP = 'INSERT' OR (TG_OP = 'UPDATE' AND NEW.image_id IS DISTINCT FROM OLD.image_id) THEN
+            PERFORM refresh_effective_fragmentation(NEW.image_id);
+        END IF;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+
+    DROP TRIGGER IF EXISTS effective_fragmentation_images ON fragmentation_images;
+    CREATE TRIGGER effective_fragmentation_images
+        AFTER INSERT OR UPDATE OR DELETE ON fragmentation_images
+        FOR EACH ROW EXECUTE FUNCTION sync_effective_from_images();
+
+    DROP TRIGGER IF EXISTS effective_fragmentation_approved ON approved_fragmentation;
+    CREATE TRIGGER effective_fragmentation_approved
+        AFTER INSERT OR UPDATE OR DELETE ON approved_fragmentation
+        FOR EACH ROW EXECUTE FUNCTION sync_effective_from_approved();
+"""
+
+EFFECTIVE_FRAGMENTATION_BACKFILL = f"""
+    INSERT INTO effective_fragmentation ({EFFECTIVE_FRAGMENTATION_COLUMNS})
+    {EFFECTIVE_FRAGMENTATION_SELECT.format(where="")}
+    ON CONFLICT (id) DO NOTHING;
+"""
+
 
 # make sure all SQLModel models are imported (app.models) before initializing DB
 # otherwise, SQLModel might fail to initialize relationships properly
@@ -99,7 +253,37 @@ async def initialize_tables(db: ProductionPostgres):
                 updated_date TIMESTAMP WITHOUT TIME ZONE NULL
             );
         """,
+        "effective_fragmentation": """
+            CREATE TABLE effective_fragmentation (
+                id INT PRIMARY KEY,
+                drawpoint_name VARCHAR(255),
+                approved_drawpoint_name VARCHAR(255),
+                created_date TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+                fine_area REAL,
+                small_area REAL,
+                medium_area REAL,
+                large_area REAL,
+                oversized_area REAL,
+                raw_image_path VARCHAR(500),
+                predicted_image_path VARCHAR(500),
+                bbox_image_path VARCHAR(500),
+                wetness SMALLINT,
+                dp_condition SMALLINT,
+                drawpointConditionComment VARCHAR(1000),
+                fragmentationComment VARCHAR(1000),
+                wetnessComment VARCHAR(1000),
+                is_edited VARCHAR(3),
+                image_status VARCHAR(20),
+                has_bund VARCHAR(3),
+                imagetaken_date TIMESTAMP WITHOUT TIME ZONE,
+                username VARCHAR(500) NOT NULL DEFAULT ''
+            );
+
+            CREATE INDEX effective_fragmentation_status_created
+                ON effective_fragmentation (image_status, created_date DESC);
+        """,
     }
+    created_tables = set()
 
     for table_name, create_sql in tables_to_create.items():
         try:
@@ -108,10 +292,87 @@ async def initialize_tables(db: ProductionPostgres):
             else:
                 logger.info(f"Creating table '{table_name}'...")
                 await db.execute_command(create_sql)
+                created_tables.add(table_name)
                 logger.info(f"Table '{table_name}' created successfully.")
         except Exception as e:
             logger.error(
                 f"Error while creating table '{table_name}': {e}", exc_info=True
             )
 
+    try:
+        logger.info("Installing effective_fragmentation triggers...")
+        await db.execute_command(EFFECTIVE_FRAGMENTATION_SYNC)
+        if "effective_fragmentation" in created_tables:
+            # triggers are live first, so nothing written meanwhile is missed
+            logger.info("Backfilling effective_fragmentation...")
+            await db.execute_command(EFFECTIVE_FRAGMENTATION_BACKFILL)
+    except Exception as e:
+        logger.error(
+            f"Error while syncing 'effective_fragmentation': {e}", exc_info=True
+        )
+
+    # Indexes behind the /images filters, safe to re-run on every start
+    indexes_to_create = {
+        "effective_fragmentation_drawpoint_prefix": """
+            CREATE INDEX IF NOT EXISTS effective_fragmentation_drawpoint_prefix
+                ON effective_fragmentation (drawpoint_name varchar_pattern_ops);
+        """,
+        "effective_fragmentation_drawpoint_trgm": """
+            CREATE EXTENSION IF NOT EXISTS pg_trgm;
+            CREATE INDEX IF NOT EXISTS effective_fragmentation_drawpoint_trgm
+                ON effective_fragmentation USING gin (drawpoint_name gin_trgm_ops);
+        """,
+        "effective_fragmentation_status_edited_bund": """
+            CREATE INDEX IF NOT EXISTS effective_fragmentation_status_edited_bund
+                ON effective_fragmentation (image_status, is_edited, has_bund, created_date DESC);
+        """,
+    }
+
+    for index_name, create_sql in indexes_to_create.items():
+        try:
+            logger.info(f"Ensuring index '{index_name}'...")
+            await db.execute_command(create_sql)
+        except Exception as e:
+            # pg_trgm needs a role allowed to create extensions; search still works without it
+            logger.error(
+                f"Error while creating index '{index_name}': {e}", exc_info=True
+            )
+
+    # Daily per-drawpoint sums/counts behind the /stats endpoint, refreshed after
+    # cavecad submissions (settings.STATS_MATERIALIZED_VIEW). Sums and counts
+    # rather than averages so coarser periods roll up exactly.
+    views_to_create = {
+        "fragmentation_stats_daily": """
+            CREATE MATERIALIZED VIEW IF NOT EXISTS fragmentation_stats_daily AS
+            SELECT
+                drawpoint_name,
+                date_trunc('day', created_date) AS day,
+                COUNT(*) AS image_count,
+                SUM(fine_area) AS fine_area_sum,
+                COUNT(fine_area) AS fine_area_count,
+                SUM(small_area) AS small_area_sum,
+                COUNT(small_area) AS small_area_count,
+                SUM(medium_area) AS medium_area_sum,
+                COUNT(medium_area) AS medium_area_count,
+                SUM(large_area) AS large_area_sum,
+                COUNT(large_area) AS large_area_count,
+                SUM(oversized_area) AS oversized_area_sum,
+                COUNT(oversized_area) AS oversized_area_count
+            FROM effective_fragmentation
+            WHERE image_status = 'submitted'
+            GROUP BY 1, 2;
+
+            -- REFRESH ... CONCURRENTLY needs a unique index
+            CREATE UNIQUE INDEX IF NOT EXISTS fragmentation_stats_daily_key
+                ON fragmentation_stats_daily (drawpoint_name, day);
+        """,
+    }
+
+    for view_name, create_sql in views_to_create.items():
+        try:
+            logger.info(f"Ensuring view '{view_name}'...")
+            await db.execute_command(create_sql)
+        except Exception as e:
+            logger.error(f"Error while creating view '{view_name}': {e}", exc_info=True)
+
     logger.info("Table initialization completed.")
@@ -1,9 +1,15 @@
+import hashlib
+import queue
+import threading
+import time
+from collections import OrderedDict, deque
 from dataclasses import dataclass
 from ldap3 import Server, Connection, ALL, SUBTREE
 from ldap3.core.exceptions import LDAPBindError
 
+from app.core.cache import TTLCache
 from app.core.config import settings
-import json
+from asyncer import asyncify
 from typing import List, Any
 from datetime import datetime
 
@@ -26,64 +32,268 @@ class LDAPUSER:
     dn: str
 
 
+USER_ATTRIBUTES = [
+    "memberOf",
+    "displayName",
+    "mail",
+    "telephoneNumber",
+    "title",
+    "department",
+    "distinguishedName",
+    "whenCreated",
+    "mailNickname",
+]
+
+NOT_IN_GROUP_DETAIL = r"""You are not in the ACCESS GROUP, contact support or your supervisor to get access.
+                Check if you can visit following folder.---------------------------------------------
+                \\burd\Data\T&IP\UG Geosciences\Geotechnical\45.Cave Management\05. Cave Monitoring\16. Weekly Inspection Photo
+                """
+
+server = Server(settings.LDAP_SERVER_URI, get_info="NO_INFO")
+
+
+def _values(entry, attribute: str) -> list:
+    return list(entry[attribute].values) if attribute in entry else []
+
+
+def _first(entry, attribute: str) -> str:
+    values = _values(entry, attribute)
+    return str(values[0]) if values else ""
+
+
+class LDAPUserRecord:
+    """The handful of LDAP fields a login needs, read straight off the entry"""
+
+    __slots__ = ("dn", "username", "display_name", "title", "mail", "groups")
+
+    def __init__(
+        self,
+        dn: str,
+        username: str,
+        display_name: str,
+        title: str,
+        mail: str,
+        groups: tuple[str, ...],
+    ):
+        self.dn = dn
+        self.username = username
+        self.display_name = display_name
+        self.title = title
+        self.mail = mail
+        # casefolded so membership checks match settings.LDAP_ALLOWED_GROUPS
+        self.groups = groups
+
+    @classmethod
+    def from_entry(cls, entry) -> "LDAPUserRecord":
+        return cls(
+            dn=entry.entry_dn,
+            username=_first(entry, "mailNickname"),
+            display_name=_first(entry, "displayName"),
+            title=_first(entry, "title"),
+            mail=_first(entry, "mail"),
+            groups=tuple(str(g).casefold() for g in _values(entry, "memberOf")),
+        )
+
+    def is_allowed(self) -> bool:
+        allowed = settings.LDAP_ALLOWED_GROUPS
+        # stops at the first allowed group instead of building an intersection
+        return any(group in allowed for group in self.groups)
+
+
+# username -> user record (incl. memberOf), skips the search on repeat logins
+user_cache: TTLCache[LDAPUserRecord] = TTLCache(
+    maxsize=settings.LDAP_CACHE_SIZE, ttl=settings.LDAP_CACHE_TTL
+)
+# (username, password digest) of recent failed binds, answered without asking LDAP
+failed_bind_cache: TTLCache[bool] = TTLCache(
+    maxsize=settings.LDAP_CACHE_SIZE, ttl=settings.LDAP_FAILED_BIND_TTL
+)
+
+
+class LoginThrottle:
+    """
+    Sliding-window count of failed binds per username. Only usernames with a
+    failure inside the window are kept, at most `maxsize` of them: /login is
+    unauthenticated, so anyone can make up usernames.
+    """
+
+    def __init__(self, max_failures: int, window: float, maxsize: int):
+        self.max_failures = max_failures
+        self.window = window
+        self.maxsize = maxsize
+        # ordered by latest failure, so the first entry is the closest to expiry
+        self._failures: OrderedDict[str, deque[float]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _recent(self, username: str, now: float) -> deque[float] | None:
+        failures = self._failures.get(username)
+        if failures is None:
+            return None
+        while failures and failures[0] <= now - self.window:
+            failures.popleft()
+        if not failures:
+            del self._failures[username]
+            return None
+        return failures
+
+    def is_locked(self, username: str) -> bool:
+        with self._lock:
+            failures = self._recent(username, time.monotonic())
+            return failures is not None and len(failures) >= self.max_failures
+
+    def record_failure(self, username: str):
+        with self._lock:
+            now = time.monotonic()
+            failures = self._recent(username, now)
+            if failures is None:
+                failures = self._failures[username] = deque()
+            failures.append(now)
+            self._failures.move_to_end(username)
+            while len(self._failures) > self.maxsize:
+                self._failures.popitem(last=False)
+
+    def reset(self, username: str):
+        with self._lock:
+            self._failures.pop(username, None)
+
+
+login_throttle = LoginThrottle(
+    settings.LDAP_MAX_FAILED_LOGINS,
+    settings.LDAP_FAILED_LOGIN_WINDOW,
+    maxsize=settings.LDAP_CACHE_SIZE,
+)
+
+
+class ServiceConnectionPool:
+    """
+    Small pool of connections bound as the service account, used for user
+    searches so a login only needs the user's own bind to check the password.
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+        self._idle: queue.LifoQueue[Connection] = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(settings.LDAP_SERVICE_USER and settings.LDAP_SERVICE_PASSWORD)
+
+    def _acquire(self) -> Connection:
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._created < self.size:
+                self._created += 1
+                try:
+                    return Connection(
+                        server,
+                        user=settings.LDAP_SERVICE_USER,
+                        password=settings.LDAP_SERVICE_PASSWORD,
+                        auto_bind=True,
+                    )
+                except Exception:
+                    self._created -= 1
+                    raise
+        return self._idle.get(timeout=settings.LDAP_TIMEOUT)
+
+    def _discard(self, conn: Connection):
+        with self._lock:
+            self._created -= 1
+        try:
+            conn.unbind()
+        except Exception:
+            pass
+
+    def search_user(self, username: str):
+        conn = self._acquire()
+        try:
+            conn.search(
+                search_base=settings.LDAP_BASE,
+                search_filter=f"(sAMAccountName={username})",
+                search_scope=SUBTREE,
+                attributes=USER_ATTRIBUTES,
+            )
+        except Exception:
+            # Dropped or expired service session; next acquire opens a fresh one
+            self._discard(conn)
+            raise
+        entries = list(conn.entries)
+        self._idle.put(conn)
+        return entries[0] if entries else None
+
+
+service_pool = ServiceConnectionPool(settings.LDAP_POOL_SIZE)
+
+
+def _bind_digest(username: str, password: str) -> str:
+    return hashlib.sha256(
+        f"{username}\0{password}\0{settings.SECRET_KEY}".encode()
+    ).hexdigest()
+
+
+def _lookup_user(username: str, conn: Connection) -> LDAPUserRecord | None:
+    cached = user_cache.get(username)
+    if cached is not None:
+        return cached
+
+    if service_pool.enabled:
+        user_entry = service_pool.search_user(username)
+    else:
+        conn.search(
+            search_base=settings.LDAP_BASE,
+            search_filter=f"(sAMAccountName={username})",
+            search_scope=SUBTREE,
+            attributes=USER_ATTRIBUTES,
+        )
+        # conn.entries can contain multiple entries if the search filter matches more than one user.
+        # Normally, with (sAMAccountName={username}), only one user should match.
+        user_entry = conn.entries[0] if conn.entries else None
+
+    if user_entry is None:
+        return None
+
+    user = LDAPUserRecord.from_entry(user_entry)
+    user_cache.set(username, user)
+    return user
+
+
 def authenticate_ldap(username, password):
     user_dn = rf"CORP\{username}"
+    if login_throttle.is_locked(username):
+        print(f"[!] Too many failed logins for {username}")
+        return None, "Too many failed login attempts, try again later."
+
+    bind_digest = _bind_digest(username, password)
+    if failed_bind_cache.get(bind_digest):
+        return None, "Authentication failed. (Wrong credentials)"
+
     try:
-        server = Server(settings.LDAP_SERVER_URI, get_info="NO_INFO")
         conn = Connection(server, user=user_dn, password=password, auto_bind=True)
         print(f"[+] Authentication successful for {username}")
-        search_filter = f"(sAMAccountName={username})"
-        conn.search(
-            search_base=settings.LDAP_BASE,
-            search_filter=search_filter,
-            search_scope=SUBTREE,
-            attributes=[
-                "memberOf",
-                "displayName",
-                "mail",
-                "telephoneNumber",
-                "title",
-                "department",
-                "distinguishedName",
-                "whenCreated",
-                "mailNickname",
-            ],
-        )
-        user_entry = None
+        login_throttle.reset(username)
+        try:
+            user = _lookup_user(username, conn)
+        finally:
+            conn.unbind()
 
-        if not conn.entries:
+        if not user:
             print("[-] User found, but no groups or info listed.")
-            conn.unbind()
             return None, "User found, but no groups or info listed."
-        else:
-            # conn.entries can contain multiple entries if the search filter matches more than one user.
-            # Normally, with (sAMAccountName={username}), only one user should match.
-            # If there are multiple entries, they could be duplicate users or unexpected results.
-            user_entry = conn.entries[0]
 
-            groups = user_entry.memberOf.values if "memberOf" in user_entry else []
-            # & gives the common elements between both sets, if its empty no intersection thus DAT USER AINT ALLOWED TO visit ZE WEB
+        # no allowed group among the user's groups, thus DAT USER AINT ALLOWED TO visit ZE WEB
+        if not user.is_allowed():
+            return None, NOT_IN_GROUP_DETAIL
 
-            print(set(settings.LDAP_ALLOWED_GROUP) & set(groups))
-            if not set(settings.LDAP_ALLOWED_GROUP) & set(groups):
-                user_entry = None
-
-        conn.unbind()
-        # Convert LDAP entry to a dictionary
-        return (
-            (json.loads(user_entry.entry_to_json()), "Success")
-            if user_entry
-            else (
-                None,
-                r"""You are not in the ACCESS GROUP, contact support or your supervisor to get access.
-                Check if you can visit following folder.---------------------------------------------
-                \\burd\Data\T&IP\UG Geosciences\Geotechnical\45.Cave Management\05. Cave Monitoring\16. Weekly Inspection Photo
-                """,
-            )
-        )
+        return user, "Success"
 
     except LDAPBindError:
         print(f"[!] Authentication failed for {username}. Wrong credentials?")
+        login_throttle.record_failure(username)
+        failed_bind_cache.set(bind_digest, True)
         return (
             None,
             f"Authentication failed. (Wrong credentials)",
@@ -91,3 +301,8 @@ def authenticate_ldap(username, password):
     except Exception as e:
         print(f"[!] LDAP error: {e}")
         return None, "LDAP error, (catostrophic failure.)"
+
+
+async def authenticate_ldap_async(username: str, password: str):
+    """authenticate_ldap on a worker thread so the event loop never waits on LDAP"""
+    return await asyncify(authenticate_ldap)(username, password)
@@ -1,63 +1,64 @@
 class Queries:
+    # Listing queries read effective_fragmentation, kept in sync with
+    # fragmentation_images/approved_fragmentation by triggers (see app.core.db).
+    # get_images takes its WHERE from app.services.images.image_filter_clause,
+    # whose parameters start at $3.
     get_images = """
         SELECT 
-                r.id, 
-                COALESCE(r.edited_dp_name, f.drawpoint_name) AS drawpoint_name,
-                r.created_date,
-                COALESCE(f.new_fine_area, r.fine_area) AS fine_area,
-                COALESCE(f.new_small_area, r.small_area) AS small_area,
-                COALESCE(f.new_medium_area, r.medium_area) AS medium_area,
-                COALESCE(f.new_large_area, r.large_area) AS large_area,
-                COALESCE(f.new_oversized_area, r.oversized_area) AS oversized_area,
-                r.raw_image_path,
-                r.predicted_image_path,
-                COALESCE(r.bbox_image_path, r.raw_image_path) AS bbox_image_path,
-                f.wetness,
-                f.dp_condition,
-                f.drawpointconditioncomment,
-                f.fragmentationcomment,
-                f.wetnesscomment,
-                r.is_edited,
-                r.image_status,
-                r.has_bund,
-                r.imagetaken_date,
-                COALESCE(f.username, '') AS username
-            FROM fragmentation_images r
-            LEFT JOIN approved_fragmentation f ON r.id = f.image_id
-            WHERE r.image_status != 'submitted'
-    ORDER BY r.created_date DESC
+                id, 
+                approved_drawpoint_name AS drawpoint_name,
+                created_date,
+                fine_area,
+                small_area,
+                medium_area,
+                large_area,
+                oversized_area,
+                raw_image_path,
+                predicted_image_path,
+                bbox_image_path,
+                wetness,
+                dp_condition,
+                drawpointconditioncomment,
+                fragmentationcomment,
+                wetnesscomment,
+                is_edited,
+                image_status,
+                has_bund,
+                imagetaken_date,
+                username
+            FROM effective_fragmentation
+            WHERE {where}
+    ORDER BY created_date DESC
     LIMIT $1
     OFFSET $2;
     """
 
     get_all_img = """
         SELECT 
-                r.id, 
-                COALESCE(r.edited_dp_name, f.drawpoint_name) AS drawpoint_name,
-                r.created_date,
-                r.image_status
-            FROM fragmentation_images r
-            LEFT JOIN approved_fragmentation f ON r.id = f.image_id
-            WHERE r.image_status != 'submitted'
-    ORDER BY r.created_date DESC
+                id, 
+                approved_drawpoint_name AS drawpoint_name,
+                created_date,
+                image_status
+            FROM effective_fragmentation
+            WHERE image_status != 'submitted'
+    ORDER BY created_date DESC
     """
 
     get_history = """
                     SELECT 
-                        r.id, 
-                        COALESCE(r.edited_dp_name, r.drawpoint_name) AS drawpoint_name,
-                        r.created_date ,
-                        COALESCE(f.new_fine_area, r.fine_area) AS fine_area,
-                        COALESCE(f.new_small_area, r.small_area) AS small_area,
-                        COALESCE(f.new_medium_area, r.medium_area) AS medium_area,
-                        COALESCE(f.new_large_area, r.large_area) AS large_area,
-                        COALESCE(f.new_oversized_area, r.oversized_area) AS oversized_area,
-                        r.raw_image_path,
-                        r.predicted_image_path,
-                        COALESCE(f.username, '') AS username
-                    FROM fragmentation_images r
-                    LEFT JOIN approved_fragmentation f ON r.id = f.image_id
-                    WHERE r.image_status = 'submitted'
+                        id, 
+                        drawpoint_name,
+                        created_date ,
+                        fine_area,
+                        small_area,
+                        medium_area,
+                        large_area,
+                        oversized_area,
+                        raw_image_path,
+                        predicted_image_path,
+                        username
+                    FROM effective_fragmentation
+                    WHERE image_status = 'submitted'
                     ORDER BY created_date DESC
                 """
 
@@ -72,3 +73,61 @@ class Queries:
     get_image_by_id = """
         SELECT * FROM fragmentation_images WHERE id = $1;
     """
+
+    # Per-drawpoint / per-period averages of submitted images in one pass.
+    # $1 period for date_trunc, $2/$3 optional date range (to is inclusive),
+    # $4 optional drawpoint. GROUPING() tells which rollup a row belongs to.
+    get_stats = """
+        WITH effective AS (
+            SELECT *, date_trunc($1, created_date) AS period
+            FROM effective_fragmentation
+            WHERE image_status = 'submitted'
+                AND ($2::date IS NULL OR created_date >= $2::date)
+                AND ($3::date IS NULL OR created_date < $3::date + 1)
+                AND ($4::text IS NULL OR drawpoint_name = $4::text)
+        )
+        SELECT
+            GROUPING(drawpoint_name) AS all_drawpoints,
+            GROUPING(period) AS all_periods,
+            drawpoint_name,
+            period,
+            COUNT(*) AS image_count,
+            AVG(fine_area) AS fine_area,
+            AVG(small_area) AS small_area,
+            AVG(medium_area) AS medium_area,
+            AVG(large_area) AS large_area,
+            AVG(oversized_area) AS oversized_area
+        FROM effective
+        GROUP BY GROUPING SETS ((drawpoint_name, period), (drawpoint_name), (period), ())
+        ORDER BY drawpoint_name NULLS FIRST, period NULLS FIRST;
+    """
+
+    # Same result as get_stats, rolled up from the daily buckets in
+    # fragmentation_stats_daily instead of scanning the images
+    get_stats_from_view = """
+        WITH effective AS (
+            SELECT *, date_trunc($1, day) AS period
+            FROM fragmentation_stats_daily
+            WHERE ($2::date IS NULL OR day >= $2::date)
+                AND ($3::date IS NULL OR day < $3::date + 1)
+                AND ($4::text IS NULL OR drawpoint_name = $4::text)
+        )
+        SELECT
+            GROUPING(drawpoint_name) AS all_drawpoints,
+            GROUPING(period) AS all_periods,
+            drawpoint_name,
+            period,
+            SUM(image_count) AS image_count,
+            SUM(fine_area_sum) / NULLIF(SUM(fine_area_count), 0) AS fine_area,
+            SUM(small_area_sum) / NULLIF(SUM(small_area_count), 0) AS small_area,
+            SUM(medium_area_sum) / NULLIF(SUM(medium_area_count), 0) AS medium_area,
+            SUM(large_area_sum) / NULLIF(SUM(large_area_count), 0) AS large_area,
+            SUM(oversized_area_sum) / NULLIF(SUM(oversized_area_count), 0) AS oversized_area
+        FROM effective
+        GROUP BY GROUPING SETS ((drawpoint_name, period), (drawpoint_name), (period), ())
+        ORDER BY drawpoint_name NULLS FIRST, period NULLS FIRST;
+    """
+
+    refresh_stats_view = """
+        REFRESH MATERIALIZED VIEW CONCURRENTLY fragmentation_stats_daily;
+    """
@@ -1,8 +1,8 @@
+import json
+from collections.abc import Iterable, Mapping
+from typing import Any
+
 import redis.asyncio as redis
-from fastapi import FastAPI, Depends
-from typing import Annotated, AsyncGenerator
-from contextlib import asynccontextmanager
-import os
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -14,47 +14,136 @@ class Settings(BaseSettings):
     )
     REDIS_URL: str = "redis://localhost"
     REDIS_POOL_SIZE: int = 10
+    # Long-lived pub/sub and blocking stream reads each pin a connection, so they
+    # get their own small pool instead of starving regular commands
+    REDIS_PUBSUB_POOL_SIZE: int = 4
     REDIS_TIMEOUT: int = 5
+    REDIS_PIPELINE_BATCH: int = 500
 
 
 settings = Settings()
 
-pool: redis.ConnectionPool = redis.ConnectionPool.from_url(
-    settings.REDIS_URL,
-    max_connections=settings.REDIS_POOL_SIZE,
-    socket_timeout=None,  # No timeout on read
-    decode_responses=True,
-)
-
 
-def get_redis_client() -> redis.Redis:
+class RedisManager:
     """
-    Get a Redis client from the pool.
+    Single owner of the app's Redis connections: one pool for regular commands
+    and one for pub/sub subscriptions and blocking reads. Pools are created on
+    first use so importing a module never opens a socket.
     """
-    return redis.Redis(connection_pool=pool)
-
 
-class RedisManager:
     def __init__(self):
-        self.pool = None
+        self.pool: redis.ConnectionPool | None = None
+        self.pubsub_pool: redis.ConnectionPool | None = None
 
-    async def init_pool(self):
-        self.pool = redis.ConnectionPool.from_url(
+    def _create_pool(
+        self, max_connections: int, socket_timeout: float | None
+    ) -> redis.ConnectionPool:
+        return redis.ConnectionPool.from_url(
             settings.REDIS_URL,
-            max_connections=settings.REDIS_POOL_SIZE,
-            socket_timeout=None,  # No timeout on read
+            max_connections=max_connections,
+            socket_timeout=socket_timeout,
             decode_responses=True,
         )
 
-    async def get_client(self):
-        if not self.pool:
-            await self.init_pool()
-        return redis.Redis(connection_pool=self.pool)
+    async def init_pool(self):
+        self.get_pool()
+        self.get_pubsub_pool()
+
+    def get_pool(self) -> redis.ConnectionPool:
+        if self.pool is None:
+            self.pool = self._create_pool(
+                settings.REDIS_POOL_SIZE, socket_timeout=settings.REDIS_TIMEOUT
+            )
+        return self.pool
+
+    def get_pubsub_pool(self) -> redis.ConnectionPool:
+        if self.pubsub_pool is None:
+            self.pubsub_pool = self._create_pool(
+                settings.REDIS_PUBSUB_POOL_SIZE,
+                socket_timeout=None,  # No timeout on read
+            )
+        return self.pubsub_pool
+
+    def get_client(self) -> redis.Redis:
+        return redis.Redis(connection_pool=self.get_pool())
+
+    def get_pubsub_client(self) -> redis.Redis:
+        return redis.Redis(connection_pool=self.get_pubsub_pool())
+
+    def pool_stats(self) -> dict[str, dict[str, int]]:
+        """Connection counts per pool, for spotting exhaustion before it bites"""
+        stats = {}
+        for name, pool in (("commands", self.pool), ("pubsub", self.pubsub_pool)):
+            if pool is None:
+                continue
+            in_use = len(pool._in_use_connections)
+            stats[name] = {
+                "max_connections": pool.max_connections,
+                "in_use": in_use,
+                "idle": len(pool._available_connections),
+                "free": pool.max_connections - in_use,
+            }
+        return stats
 
     async def kill_pool(self):
-        if self.pool:
-            await self.pool.aclose()
-            await self.pool.disconnect()
+        for pool in (self.pool, self.pubsub_pool):
+            if pool:
+                await pool.aclose()
+        self.pool = None
+        self.pubsub_pool = None
 
 
 redis_manager = RedisManager()
+
+
+def get_redis_client() -> redis.Redis:
+    """
+    Get a Redis client for regular commands.
+    """
+    return redis_manager.get_client()
+
+
+def get_pubsub_client() -> redis.Redis:
+    """
+    Get a Redis client for pub/sub and blocking reads.
+    """
+    return redis_manager.get_pubsub_client()
+
+
+def _chunks(items: list[Any], size: int) -> Iterable[list[Any]]:
+    for start in range(0, len(items), size):
+        yield items[start : start + size]
+
+
+async def get_many(client: redis.Redis, keys: list[str]) -> list[str | None]:
+    """MGET in chunks of REDIS_PIPELINE_BATCH keys, values in key order"""
+    values: list[str | None] = []
+    for chunk in _chunks(keys, settings.REDIS_PIPELINE_BATCH):
+        values.extend(await client.mget(chunk))
+    return values
+
+
+async def get_many_json(client: redis.Redis, keys: list[str]) -> list[Any | None]:
+    return [
+        json.loads(value) if value is not None else None
+        for value in await get_many(client, keys)
+    ]
+
+
+async def set_many(
+    client: redis.Redis, mapping: Mapping[str, str], ex: int | None = None
+) -> None:
+    """SET every key in one round trip per REDIS_PIPELINE_BATCH keys"""
+    items = list(mapping.items())
+    for chunk in _chunks(items, settings.REDIS_PIPELINE_BATCH):
+        async with client.pipeline(transaction=False) as pipe:
+            for key, value in chunk:
+                pipe.set(key, value, ex=ex)
+            await pipe.execute()
+
+
+async def delete_many(client: redis.Redis, keys: list[str]) -> int:
+    deleted = 0
+    for chunk in _chunks(keys, settings.REDIS_PIPELINE_BATCH):
+        deleted += await client.delete(*chunk)
+    return deleted
@@ -1,16 +1,32 @@
+import asyncio
+import hashlib
+import multiprocessing
+import time
+from collections.abc import Callable
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta, timezone
-from typing import Any
+from typing import Any, TypeVar
 
 import jwt
 from passlib.context import CryptContext
 
 from app.core.config import settings
+from app.core.redis import get_redis_client
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# min/max pinned to the configured cost so needs_update() flags any other cost
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=settings.BCRYPT_ROUNDS,
+    bcrypt__min_rounds=settings.BCRYPT_ROUNDS,
+    bcrypt__max_rounds=settings.BCRYPT_ROUNDS,
+)
 
 
 ALGORITHM = "HS256"
 
+T = TypeVar("T")
+
 
 def create_access_token(subject: dict | Any, expires_delta: timedelta) -> str:
     expire = datetime.now(timezone.utc) + expires_delta
@@ -28,3 +44,91 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
 
 def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
+
+
+def verify_and_update_password(
+    plain_password: str, hashed_password: str
+) -> tuple[bool, str | None]:
+    """(verified, new hash) where new hash is set when the stored one uses a stale cost"""
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
+
+_hash_pool: ProcessPoolExecutor | None = None
+_hash_slots: asyncio.Semaphore | None = None
+
+
+def get_hash_pool() -> ProcessPoolExecutor:
+    global _hash_pool
+    if _hash_pool is None:
+        # spawn, not fork: forking a process with a running event loop and
+        # threads (DB drivers, Redis) can deadlock the child
+        _hash_pool = ProcessPoolExecutor(
+            max_workers=settings.PASSWORD_HASH_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _hash_pool
+
+
+def shutdown_hash_pool() -> None:
+    global _hash_pool
+    if _hash_pool is not None:
+        _hash_pool.shutdown(wait=False, cancel_futures=True)
+        _hash_pool = None
+
+
+async def _run_in_hash_pool(func: Callable[..., T], *args: Any) -> T:
+    """Run bcrypt work in the process pool, at most PASSWORD_HASH_MAX_PENDING at once"""
+    global _hash_slots
+    if _hash_slots is None:
+        _hash_slots = asyncio.Semaphore(settings.PASSWORD_HASH_MAX_PENDING)
+    async with _hash_slots:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(get_hash_pool(), func, *args)
+
+
+async def get_password_hash_async(password: str) -> str:
+    return await _run_in_hash_pool(get_password_hash, password)
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    return await _run_in_hash_pool(verify_password, plain_password, hashed_password)
+
+
+async def verify_and_update_password_async(
+    plain_password: str, hashed_password: str
+) -> tuple[bool, str | None]:
+    return await _run_in_hash_pool(
+        verify_and_update_password, plain_password, hashed_password
+    )
+
+
+async def hash_passwords(passwords: list[str]) -> list[str]:
+    """Hash many passwords in the process pool, results in input order"""
+    return list(await asyncio.gather(*(get_password_hash_async(p) for p in passwords)))
+
+
+def token_fingerprint(token: str) -> str:
+    """Stable key for a token that doesn't keep the token itself around"""
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def _revocation_key(fingerprint: str) -> str:
+    return f"{settings.TOKEN_REVOCATION_PREFIX}:{fingerprint}"
+
+
+async def revoke_token(token: str) -> None:
+    """Deny-list a token in Redis until it would have expired anyway"""
+    try:
+        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[ALGORITHM])
+    except jwt.InvalidTokenError:
+        return
+    remaining = int(payload.get("exp", 0) - time.time())
+    if remaining <= 0:
+        return
+    await get_redis_client().set(
+        _revocation_key(token_fingerprint(token)), 1, ex=remaining
+    )
+
+
+async def is_token_revoked(fingerprint: str) -> bool:
+    return bool(await get_redis_client().exists(_revocation_key(fingerprint)))
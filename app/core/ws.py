@@ -1,53 +1,201 @@
 import asyncio
+import json
+import logging
+import os
+import socket
+import time
+import uuid
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Any
+
 from fastapi import WebSocket
-import redis.asyncio as aioredis
-from fastapi import WebSocket
-from redis.asyncio.client import PubSub
 
-from app.core.redis import get_redis_client
 from app.core.config import settings
-import logging
+from app.core.redis import (
+    delete_many,
+    get_many,
+    get_pubsub_client,
+    get_redis_client,
+    set_many,
+)
 
 logger = logging.getLogger(__name__)
 
+# Topic that maps onto the bare SUBSCRIBED_CHANNEL; every other topic lives on
+# "<SUBSCRIBED_CHANNEL>:<topic>" and is picked up by the pattern subscription.
+DEFAULT_TOPIC = "jobs"
+CONTROL_ACTIONS = ("subscribe", "unsubscribe")
+PING_FRAME = json.dumps({"type": "ping"})
+
+
+@dataclass
+class ConnectionState:
+    """Liveness and inbound rate-limit bookkeeping for one socket"""
+
+    last_seen: float = field(default_factory=time.monotonic)
+    tokens: float = float(settings.WS_RATE_BURST)
+    last_refill: float = field(default_factory=time.monotonic)
+
+
+def stream_id_key(event_id: str) -> tuple[int, int]:
+    """Sortable form of a Redis Stream id ("<ms>-<seq>")"""
+    ms, _, seq = event_id.partition("-")
+    return int(ms), int(seq or 0)
+
+
+def is_stream_id(event_id: str) -> bool:
+    try:
+        stream_id_key(event_id)
+    except ValueError:
+        return False
+    return True
+
 
 class ConnectionManager:
     def __init__(self):
         self.active_connections: dict[str, WebSocket] = {}
+        # topic -> connection ids, plus the reverse index so disconnects are O(topics)
+        self.topic_connections: dict[str, set[str]] = {}
+        self.connection_topics: dict[str, set[str]] = {}
+        self.connection_state: dict[str, ConnectionState] = {}
+        # accepted / reaped (idle) / dropped (failed or timed-out sends) / rate_limited
+        self.stats: Counter[str] = Counter()
+        # Gauges for the Redis listener; counters live in self.stats
+        self.listener_metrics: dict[str, float] = {
+            "last_batch_size": 0,
+            "max_batch_size": 0,
+            "last_dispatch_ms": 0.0,
+            "stream_lag_ms": 0.0,
+        }
         self.redis_client = get_redis_client()
-        self.pubsub = self.redis_client.pubsub()
+        # Subscriptions and blocking XREADs pin connections, so they use the pubsub pool
+        self.blocking_client = get_pubsub_client()
+        self.pubsub = self.blocking_client.pubsub()
         self.channel = settings.SUBSCRIBED_CHANNEL
+        self.topic_pattern = f"{self.channel}:*"
+        # Each worker owns a private channel used for direct-to-connection routing
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.worker_channel = f"{self.channel}.worker.{self.worker_id}"
+        self.presence_prefix = settings.WS_PRESENCE_PREFIX
+        # The jobs topic is backed by a capped stream; live events for a connection
+        # that is still replaying are parked here and flushed once replay is done
+        self.stream = f"{self.channel}.stream"
+        self.replaying: dict[str, list[tuple[str, str]]] = {}
         self.listen_task = None
+        self.heartbeat_task = None
+        self.stream_task = None
+        self.keepalive_task = None
         self._shutdown_event = asyncio.Event()
 
+    def channel_for(self, topic: str) -> str:
+        """Redis channel a topic is published on"""
+        if topic == DEFAULT_TOPIC:
+            return self.channel
+        return f"{self.channel}:{topic}"
+
+    def topic_for(self, channel: str) -> str:
+        """Topic a Redis channel belongs to"""
+        if channel == self.channel:
+            return DEFAULT_TOPIC
+        return channel.removeprefix(f"{self.channel}:")
+
+    def presence_key(self, connection_id: str) -> str:
+        return f"{self.presence_prefix}:{connection_id}"
+
     async def subscribe(self):
-        await self.pubsub.subscribe(self.channel)
+        await self.pubsub.subscribe(self.channel, self.worker_channel)
+        await self.pubsub.psubscribe(self.topic_pattern)
 
     async def unsubscribe(self):
-        await self.pubsub.unsubscribe(self.channel)
+        await self.pubsub.unsubscribe(self.channel, self.worker_channel)
+        await self.pubsub.punsubscribe(self.topic_pattern)
 
     async def listen(self):
-        """Listen for Redis messages and broadcast to WebSocket clients"""
-        if not self.pubsub.subscribed:
-            await self.subscribe()
-
+        """
+        Supervise the Redis pub/sub loop. Any Redis failure resets the pubsub,
+        waits with exponential backoff and resubscribes instead of giving up.
+        """
+        backoff = settings.WS_LISTENER_BACKOFF_MIN
         try:
-            async for message in self.pubsub.listen():
-                # Check if shutdown was requested
-                if self._shutdown_event.is_set():
-                    break
-
-                if message["type"] == "message":
-                    await self.broadcast(message["data"])
+            while not self._shutdown_event.is_set():
+                try:
+                    await self.subscribe()
+                    backoff = settings.WS_LISTENER_BACKOFF_MIN
+                    await self._drain_pubsub()
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    self.stats["listener_reconnects"] += 1
+                    logger.error(
+                        f"Redis listener failed, resubscribing in {backoff:.1f}s: {e}"
+                    )
+                    await self._reset_pubsub()
+                    await asyncio.sleep(backoff)
+                    backoff = min(backoff * 2, settings.WS_LISTENER_BACKOFF_MAX)
         except asyncio.CancelledError:
             logger.info("Redis listener task was cancelled")
             raise
-        except Exception as e:
-            logger.error(f"Error in listening to Redis channel: {e}")
         finally:
             logger.info("UNSUBSCRIBING FROM CHANNEL")
             await self.cleanup_redis()
 
+    async def _drain_pubsub(self):
+        """Pull whatever is buffered (up to WS_LISTENER_BATCH_SIZE) and dispatch it as one batch"""
+        while not self._shutdown_event.is_set():
+            message = await self.pubsub.get_message(
+                ignore_subscribe_messages=True, timeout=1.0
+            )
+            if message is None:
+                continue
+
+            batch = [message]
+            while len(batch) < settings.WS_LISTENER_BATCH_SIZE:
+                message = await self.pubsub.get_message(
+                    ignore_subscribe_messages=True, timeout=0.0
+                )
+                if message is None:
+                    break
+                batch.append(message)
+
+            started = time.monotonic()
+            await self._dispatch(batch)
+            self.stats["listener_batches"] += 1
+            self.stats["listener_messages"] += len(batch)
+            self.listener_metrics["last_batch_size"] = len(batch)
+            self.listener_metrics["max_batch_size"] = max(
+                self.listener_metrics["max_batch_size"], len(batch)
+            )
+            self.listener_metrics["last_dispatch_ms"] = round(
+                (time.monotonic() - started) * 1000, 2
+            )
+
+    async def _dispatch(self, batch: list[dict]):
+        """Coalesce a batch into one frame per topic; direct messages go out as-is"""
+        by_topic: dict[str, list[str]] = {}
+        for message in batch:
+            if message["type"] not in ("message", "pmessage"):
+                continue
+            if message["channel"] == self.worker_channel:
+                await self._deliver_direct(message["data"])
+                continue
+            topic = self.topic_for(message["channel"])
+            by_topic.setdefault(topic, []).append(message["data"])
+
+        for topic, messages in by_topic.items():
+            if len(messages) == 1:
+                await self.send_to_topic(topic, messages[0])
+            else:
+                await self.send_batch_to_topic(topic, messages)
+
+    async def _reset_pubsub(self):
+        """Throw away a broken pubsub connection so the next subscribe starts clean"""
+        try:
+            await self.pubsub.aclose()
+        except Exception as e:
+            logger.error(f"Error closing broken pubsub: {e}")
+        self.pubsub = self.blocking_client.pubsub()
+
     async def cleanup_redis(self):
         """Clean up Redis connections"""
         try:
@@ -58,37 +206,432 @@ class ConnectionManager:
         except Exception as e:
             logger.error(f"Error cleaning up Redis: {e}")
 
-    async def connect(self, websocket: WebSocket, user_id: str):
+    async def connect(
+        self,
+        websocket: WebSocket,
+        user_id: str,
+        topics: set[str] | None = None,
+        last_event_id: str | None = None,
+    ):
         await websocket.accept()
 
         self.active_connections[user_id] = websocket
+        self.connection_topics[user_id] = set()
+        self.connection_state[user_id] = ConnectionState()
+        self.stats["accepted"] += 1
+        if (
+            last_event_id
+            and is_stream_id(last_event_id)
+            and DEFAULT_TOPIC in (topics or {DEFAULT_TOPIC})
+        ):
+            self.replaying[user_id] = []
+        for topic in topics or {DEFAULT_TOPIC}:
+            self.subscribe_connection(user_id, topic)
 
-    def disconnect(self, connection_id: str):
+        try:
+            await self.redis_client.set(
+                self.presence_key(user_id),
+                self.worker_id,
+                ex=settings.WS_PRESENCE_TTL,
+            )
+        except Exception as e:
+            logger.error(f"Error registering presence for {user_id}: {e}")
+
+        if user_id in self.replaying:
+            await self.replay(user_id, last_event_id)
+
+    async def disconnect(self, connection_id: str):
         if connection_id in self.active_connections:
             del self.active_connections[connection_id]
 
-    async def send_message(self, message: str):
-        for connection in self.active_connections.values():
-            await connection.send_text(message)
+        for topic in self.connection_topics.pop(connection_id, set()):
+            self._discard_from_topic(connection_id, topic)
+        self.replaying.pop(connection_id, None)
+        self.connection_state.pop(connection_id, None)
+
+        try:
+            await self.redis_client.delete(self.presence_key(connection_id))
+        except Exception as e:
+            logger.error(f"Error removing presence for {connection_id}: {e}")
+
+    def subscribe_connection(self, connection_id: str, topic: str):
+        if connection_id not in self.active_connections:
+            return
+        self.topic_connections.setdefault(topic, set()).add(connection_id)
+        self.connection_topics[connection_id].add(topic)
+
+    def unsubscribe_connection(self, connection_id: str, topic: str):
+        topics = self.connection_topics.get(connection_id)
+        if topics is None or topic not in topics:
+            return
+        topics.discard(topic)
+        self._discard_from_topic(connection_id, topic)
+
+    def _discard_from_topic(self, connection_id: str, topic: str):
+        subscribers = self.topic_connections.get(topic)
+        if subscribers is None:
+            return
+        subscribers.discard(connection_id)
+        if not subscribers:
+            del self.topic_connections[topic]
+
+    async def handle_control(self, connection_id: str, data: str) -> bool:
+        """
+        Apply a subscribe/unsubscribe control message sent by a client.
+        Returns False when the text is not a control message.
+        """
+        try:
+            payload = json.loads(data)
+        except ValueError:
+            return False
+        if not isinstance(payload, dict):
+            return False
+
+        action = payload.get("action")
+        if action == "pong":
+            return True
+
+        topic = payload.get("topic")
+        if action not in CONTROL_ACTIONS or not isinstance(topic, str) or not topic:
+            return False
+
+        if action == "subscribe":
+            self.subscribe_connection(connection_id, topic)
+        else:
+            self.unsubscribe_connection(connection_id, topic)
+
+        await self._send(
+            connection_id,
+            json.dumps(
+                {
+                    "type": action,
+                    "topic": topic,
+                    "topics": sorted(self.connection_topics[connection_id]),
+                }
+            ),
+        )
+        return True
+
+    def touch(self, connection_id: str):
+        """Record inbound traffic; any frame counts as proof of life"""
+        state = self.connection_state.get(connection_id)
+        if state is not None:
+            state.last_seen = time.monotonic()
+
+    def allow_message(self, connection_id: str) -> bool:
+        """Token bucket of WS_RATE_LIMIT messages/s with bursts up to WS_RATE_BURST"""
+        state = self.connection_state.get(connection_id)
+        if state is None:
+            return False
+
+        now = time.monotonic()
+        state.tokens = min(
+            float(settings.WS_RATE_BURST),
+            state.tokens + (now - state.last_refill) * settings.WS_RATE_LIMIT,
+        )
+        state.last_refill = now
+        if state.tokens < 1:
+            self.stats["rate_limited"] += 1
+            return False
+        state.tokens -= 1
+        return True
+
+    async def _send(self, connection_id: str, payload: str) -> bool:
+        """
+        Send to one socket, bounded by WS_SEND_TIMEOUT. A socket that errors or
+        cannot keep up is dropped so it stops holding up every fan-out.
+        """
+        websocket = self.active_connections.get(connection_id)
+        if websocket is None:
+            return False
+        try:
+            await asyncio.wait_for(
+                websocket.send_text(payload), timeout=settings.WS_SEND_TIMEOUT
+            )
+            return True
+        except Exception as e:
+            logger.warning(f"Dropping WebSocket {connection_id}: {e!r}")
+            self.stats["dropped"] += 1
+            await self.close(connection_id)
+            return False
+
+    async def close(self, connection_id: str, code: int = 1001):
+        """Close a socket from the server side and forget about it"""
+        websocket = self.active_connections.get(connection_id)
+        await self.disconnect(connection_id)
+        if websocket is None:
+            return
+        try:
+            await websocket.close(code=code)
+        except Exception:
+            # Already closed by the peer or mid-handshake; nothing left to do
+            pass
+
+    async def send_to_topic(
+        self, topic: str, message: str, event_id: str | None = None
+    ):
+        """Send a message to the connections subscribed to a topic"""
+        subscribers = self.topic_connections.get(topic)
+        if not subscribers:
+            return
+
+        envelope = {"topic": topic, "data": message}
+        if event_id is not None:
+            envelope["id"] = event_id
+        await self._fan_out(subscribers, json.dumps(envelope), event_id)
+
+    async def send_batch_to_topic(self, topic: str, messages: list[str]):
+        """Send several messages for one topic as a single frame"""
+        subscribers = self.topic_connections.get(topic)
+        if not subscribers:
+            return
+
+        await self._fan_out(
+            subscribers, json.dumps({"topic": topic, "batch": messages})
+        )
+
+    async def _fan_out(
+        self, subscribers: set[str], payload: str, event_id: str | None = None
+    ):
+        targets = []
+        for connection_id in list(subscribers):
+            if event_id is not None and connection_id in self.replaying:
+                self.replaying[connection_id].append((event_id, payload))
+                continue
+            targets.append(connection_id)
+
+        # Sends run concurrently so one slow client only costs WS_SEND_TIMEOUT once
+        await asyncio.gather(*(self._send(c, payload) for c in targets))
+
+    async def publish(self, topic: str, message: str):
+        """Publish a message to a topic through Redis so every worker forwards it"""
+        if topic == DEFAULT_TOPIC:
+            await self.redis_client.xadd(
+                self.stream,
+                {"data": message},
+                maxlen=settings.WS_REPLAY_MAXLEN,
+                approximate=True,
+            )
+            return
+        await self.redis_client.publish(self.channel_for(topic), message)
+
+    async def replay(self, connection_id: str, last_event_id: str):
+        """
+        Send a reconnecting client the jobs events it missed after last_event_id.
+        Tells the client to do a full reload when the id has been trimmed away.
+        """
+        last_sent = last_event_id
+        try:
+            oldest = await self.redis_client.xrange(self.stream, count=1)
+            if oldest and stream_id_key(last_event_id) < stream_id_key(oldest[0][0]):
+                await self._send(
+                    connection_id,
+                    json.dumps({"type": "replay_gap", "topic": DEFAULT_TOPIC}),
+                )
+            else:
+                missed = await self.redis_client.xrange(
+                    self.stream,
+                    min=f"({last_event_id}",
+                    count=settings.WS_REPLAY_MAXLEN,
+                )
+                for event_id, fields in missed:
+                    frame = {
+                        "topic": DEFAULT_TOPIC,
+                        "data": fields.get("data", ""),
+                        "id": event_id,
+                    }
+                    if not await self._send(connection_id, json.dumps(frame)):
+                        break
+                    last_sent = event_id
+        except Exception as e:
+            logger.error(f"Error replaying jobs stream for {connection_id}: {e}")
+        finally:
+            parked = self.replaying.pop(connection_id, [])
+
+        # Live events that arrived while replaying, minus the ones replay covered
+        for event_id, payload in parked:
+            if connection_id not in self.active_connections:
+                break
+            if stream_id_key(event_id) > stream_id_key(last_sent):
+                await self._send(connection_id, payload)
+
+    async def read_stream(self):
+        """Forward new jobs stream entries to subscribed clients"""
+        # "$" would only mean "newer than now" on each XREAD, dropping whatever
+        # arrived between two calls; pin the current tail once and move from there
+        last_id: str | None = None
+        backoff = settings.WS_LISTENER_BACKOFF_MIN
+        while not self._shutdown_event.is_set():
+            try:
+                if last_id is None:
+                    tail = await self.blocking_client.xrevrange(self.stream, count=1)
+                    last_id = tail[0][0] if tail else "0-0"
+                entries = await self.blocking_client.xread(
+                    {self.stream: last_id},
+                    count=settings.WS_LISTENER_BATCH_SIZE,
+                    block=settings.WS_REPLAY_BLOCK_MS,
+                )
+                backoff = settings.WS_LISTENER_BACKOFF_MIN
+                for _stream, events in entries or []:
+                    for event_id, fields in events:
+                        last_id = event_id
+                        await self.send_to_topic(
+                            DEFAULT_TOPIC, fields.get("data", ""), event_id=event_id
+                        )
+                    if events:
+                        # Stream ids start with the XADD time, so this is true end-to-end lag
+                        published_ms = stream_id_key(events[-1][0])[0]
+                        self.listener_metrics["stream_lag_ms"] = max(
+                            0.0, time.time() * 1000 - published_ms
+                        )
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.stats["stream_reconnects"] += 1
+                logger.error(
+                    f"Error reading jobs stream, retrying in {backoff:.1f}s: {e}"
+                )
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, settings.WS_LISTENER_BACKOFF_MAX)
+
+    async def send_to_connection(self, connection_id: str, message: str) -> bool:
+        """
+        Send a message to a single connection, wherever it is connected.
+        Returns False when the connection is not known to the cluster.
+        """
+        if connection_id in self.active_connections:
+            return await self._send(
+                connection_id, json.dumps({"topic": None, "data": message})
+            )
+
+        worker_id = await self.redis_client.get(self.presence_key(connection_id))
+        if worker_id is None:
+            return False
+
+        await self.redis_client.publish(
+            f"{self.channel}.worker.{worker_id}",
+            json.dumps({"connection_id": connection_id, "data": message}),
+        )
+        return True
+
+    async def _deliver_direct(self, raw: str):
+        try:
+            payload = json.loads(raw)
+        except ValueError:
+            logger.error(f"Dropping malformed direct message: {raw[:100]}")
+            return
+
+        await self._send(
+            payload.get("connection_id"),
+            json.dumps({"topic": None, "data": payload.get("data")}),
+        )
+
+    async def cluster_connections(self) -> dict[str, str]:
+        """Connection id -> worker id for every live connection in the cluster"""
+        keys = [
+            key
+            async for key in self.redis_client.scan_iter(
+                match=f"{self.presence_prefix}:*", count=500
+            )
+        ]
+        if not keys:
+            return {}
+
+        workers = await get_many(self.redis_client, keys)
+        offset = len(self.presence_prefix) + 1
+        return {
+            key[offset:]: worker
+            for key, worker in zip(keys, workers, strict=True)
+            if worker is not None
+        }
+
+    async def heartbeat(self):
+        """Refresh the presence TTL of every local connection"""
+        while not self._shutdown_event.is_set():
+            await asyncio.sleep(settings.WS_PRESENCE_HEARTBEAT)
+            if not self.active_connections:
+                continue
+            try:
+                await set_many(
+                    self.redis_client,
+                    {
+                        self.presence_key(connection_id): self.worker_id
+                        for connection_id in list(self.active_connections)
+                    },
+                    ex=settings.WS_PRESENCE_TTL,
+                )
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error refreshing WebSocket presence: {e}")
+
+    async def keepalive(self):
+        """Ping every socket and, with WS_IDLE_TIMEOUT set, reap the ones that went quiet"""
+        while not self._shutdown_event.is_set():
+            await asyncio.sleep(settings.WS_PING_INTERVAL)
+
+            if settings.WS_IDLE_TIMEOUT:
+                deadline = time.monotonic() - settings.WS_IDLE_TIMEOUT
+                idle = [
+                    connection_id
+                    for connection_id, state in self.connection_state.items()
+                    if state.last_seen < deadline
+                ]
+                for connection_id in idle:
+                    logger.info(f"Reaping idle WebSocket {connection_id}")
+                    self.stats["reaped"] += 1
+                    await self.close(connection_id)
+
+            await self.broadcast(PING_FRAME)
+
+    def connection_stats(self) -> dict[str, Any]:
+        return {
+            "live": len(self.active_connections),
+            **self.stats,
+            "listener": dict(self.listener_metrics),
+        }
 
     async def broadcast(self, message: str):
-        for connection in self.active_connections.values():
-            await connection.send_text(message)
+        await asyncio.gather(
+            *(self._send(c, message) for c in list(self.active_connections))
+        )
 
     async def start_listening(self):
         """Start the Redis listener task"""
         if self.listen_task is None or self.listen_task.done():
             self.listen_task = asyncio.create_task(self.listen())
+        if self.heartbeat_task is None or self.heartbeat_task.done():
+            self.heartbeat_task = asyncio.create_task(self.heartbeat())
+        if self.stream_task is None or self.stream_task.done():
+            self.stream_task = asyncio.create_task(self.read_stream())
+        if self.keepalive_task is None or self.keepalive_task.done():
+            self.keepalive_task = asyncio.create_task(self.keepalive())
 
     async def stop_listening(self):
         """Stop the Redis listener task"""
         self._shutdown_event.set()
-        if self.listen_task and not self.listen_task.done():
-            self.listen_task.cancel()
+        for task in (
+            self.listen_task,
+            self.heartbeat_task,
+            self.stream_task,
+            self.keepalive_task,
+        ):
+            if task and not task.done():
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+
+        # Drop this worker's connections now rather than waiting for the TTL
+        if self.active_connections:
             try:
-                await self.listen_task
-            except asyncio.CancelledError:
-                pass
+                await delete_many(
+                    self.redis_client,
+                    [self.presence_key(c) for c in self.active_connections],
+                )
+            except Exception as e:
+                logger.error(f"Error clearing WebSocket presence: {e}")
 
 
 websocket_conn_man = ConnectionManager()
@@ -1,10 +1,27 @@
 import uuid
 from typing import Any
 
-from sqlmodel import Session, select
+from sqlalchemy import insert, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm.exc import StaleDataError
+from sqlmodel import Session, col, select
+from sqlmodel.ext.asyncio.session import AsyncSession
 
-from app.core.security import get_password_hash, verify_password
-from app.models import Item, ItemCreate, User, UserCreate, UserUpdate
+from app.core.security import (
+    get_password_hash,
+    get_password_hash_async,
+    hash_passwords,
+    verify_and_update_password_async,
+    verify_password,
+)
+from app.models import (
+    Item,
+    ItemCreate,
+    User,
+    UserBulkUpdate,
+    UserCreate,
+    UserUpdate,
+)
 
 
 def create_user(*, session: Session, user_create: UserCreate) -> User:
@@ -52,3 +69,183 @@ def create_item(*, session: Session, item_in: ItemCreate, owner_id: uuid.UUID) -
     session.commit()
     session.refresh(db_item)
     return db_item
+
+
+# Async counterparts used by request handlers (see app.api.deps.SessionDep)
+
+
+async def create_user_async(*, session: AsyncSession, user_create: UserCreate) -> User:
+    hashed_password = await get_password_hash_async(user_create.password)
+    db_obj = User.model_validate(
+        user_create, update={"hashed_password": hashed_password}
+    )
+    session.add(db_obj)
+    await session.commit()
+    await session.refresh(db_obj)
+    return db_obj
+
+
+async def update_user_async(
+    *, session: AsyncSession, db_user: User, user_in: UserUpdate
+) -> Any:
+    user_data = user_in.model_dump(exclude_unset=True)
+    extra_data = {}
+    if "password" in user_data:
+        password = user_data["password"]
+        hashed_password = await get_password_hash_async(password)
+        extra_data["hashed_password"] = hashed_password
+    db_user.sqlmodel_update(user_data, update=extra_data)
+    session.add(db_user)
+    await session.commit()
+    await session.refresh(db_user)
+    return db_user
+
+
+async def get_user_by_email_async(*, session: AsyncSession, email: str) -> User | None:
+    statement = select(User).where(User.email == email)
+    session_user = (await session.exec(statement)).first()
+    return session_user
+
+
+async def authenticate_async(
+    *, session: AsyncSession, email: str, password: str
+) -> User | None:
+    """
+    Local-password login, rehashing at the current BCRYPT_ROUNDS on success.
+    Not called by any route yet: /login authenticates against LDAP only.
+    """
+    db_user = await get_user_by_email_async(session=session, email=email)
+    if not db_user:
+        return None
+    verified, new_hash = await verify_and_update_password_async(
+        password, db_user.hashed_password
+    )
+    if not verified:
+        return None
+    if new_hash:
+        # stored hash predates the current BCRYPT_ROUNDS, upgrade it while we have the password
+        db_user.hashed_password = new_hash
+        session.add(db_user)
+        await session.commit()
+        await session.refresh(db_user)
+    return db_user
+
+
+async def create_item_async(
+    *, session: AsyncSession, item_in: ItemCreate, owner_id: uuid.UUID
+) -> Item:
+    db_item = Item.model_validate(item_in, update={"owner_id": owner_id})
+    session.add(db_item)
+    await session.commit()
+    await session.refresh(db_item)
+    return db_item
+
+
+class UsersNotFound(Exception):
+    def __init__(self, user_ids: list[uuid.UUID]):
+        self.user_ids = user_ids
+        super().__init__(f"Users not found: {', '.join(map(str, user_ids))}")
+
+
+async def missing_user_ids(
+    *, session: AsyncSession, user_ids: list[uuid.UUID]
+) -> list[uuid.UUID]:
+    found = set(
+        await session.scalars(select(User.id).where(col(User.id).in_(user_ids)))
+    )
+    return [user_id for user_id in dict.fromkeys(user_ids) if user_id not in found]
+
+
+# Bulk variants: one multi-row INSERT ... RETURNING / executemany UPDATE and a
+# single commit, with bcrypt spread over the hashing process pool
+
+
+async def create_users_bulk(
+    *, session: AsyncSession, users_create: list[UserCreate]
+) -> list[User]:
+    if not users_create:
+        return []
+
+    hashed_passwords = await hash_passwords([u.password for u in users_create])
+    rows = [
+        {
+            **user_create.model_dump(exclude={"password"}),
+            "id": uuid.uuid4(),
+            "hashed_password": hashed_password,
+        }
+        for user_create, hashed_password in zip(
+            users_create, hashed_passwords, strict=True
+        )
+    ]
+    users = list(await session.scalars(insert(User).returning(User), rows))
+    await session.commit()
+    return users
+
+
+async def update_users_bulk(
+    *, session: AsyncSession, users_in: list[UserBulkUpdate]
+) -> int:
+    """
+    Update users by id and return how many were matched. Raises UsersNotFound,
+    with nothing written, when any id doesn't exist.
+    """
+    if not users_in:
+        return 0
+
+    # checked up front so a bad id fails fast, before any bcrypt work
+    missing = await missing_user_ids(
+        session=session, user_ids=[user_in.id for user_in in users_in]
+    )
+    if missing:
+        raise UsersNotFound(missing)
+
+    rows = [user_in.model_dump(exclude_unset=True) for user_in in users_in]
+    to_hash = [row for row in rows if row.get("password")]
+    hashed_passwords = await hash_passwords([row["password"] for row in to_hash])
+    for row, hashed_password in zip(to_hash, hashed_passwords, strict=True):
+        row["hashed_password"] = hashed_password
+    for row in rows:
+        row.pop("password", None)
+
+    # ORM bulk UPDATE by primary key; rows with the same keys share one executemany
+    try:
+        await session.execute(update(User), rows)
+    except StaleDataError:
+        # a user was deleted since the check above
+        await session.rollback()
+        raise UsersNotFound(
+            await missing_user_ids(
+                session=session, user_ids=[row["id"] for row in rows]
+            )
+        )
+    await session.commit()
+    return len(rows)
+
+
+async def create_items_bulk(
+    *, session: AsyncSession, items_in: list[ItemCreate], owner_id: uuid.UUID
+) -> list[Item]:
+    """
+    Insert items for one owner in one statement. Raises UsersNotFound, with
+    nothing written, when the owner doesn't exist.
+    """
+    if not items_in:
+        return []
+
+    if await missing_user_ids(session=session, user_ids=[owner_id]):
+        raise UsersNotFound([owner_id])
+
+    rows = [
+        {**item_in.model_dump(), "id": uuid.uuid4(), "owner_id": owner_id}
+        for item_in in items_in
+    ]
+    try:
+        items = list(await session.scalars(insert(Item).returning(Item), rows))
+    except IntegrityError:
+        # the owner was deleted since the check above
+        await session.rollback()
+        if await missing_user_ids(session=session, user_ids=[owner_id]):
+            raise UsersNotFound([owner_id])
+        raise
+    await session.commit()
+    return items
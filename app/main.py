@@ -12,8 +12,10 @@ from app.core.config import settings
 from app.core.db import initialize_tables
 from app.core.postgres import cavecad as cavecad_db
 from app.core.postgres import db_pg as database
-from app.core.redis import pool, redis_manager
+from app.core.redis import redis_manager
+from app.core.security import shutdown_hash_pool
 from app.core.ws import websocket_conn_man
+from app.services.analysis_jobs import analysis_jobs
 
 logger = logging.getLogger(__name__)
 
@@ -30,18 +32,21 @@ if settings.SENTRY_DSN and settings.ENVIRONMENT != "local":
 async def lifespan(app: FastAPI):
     # Startup items
     logger.info("Starting Redis listener...")
+    await redis_manager.init_pool()
     await websocket_conn_man.start_listening()
+    await analysis_jobs.start()
     # await database.connect()
-    await redis_manager.init_pool()
     # await asyncio.create_subprocess_exec("./src/scripts/run-mcp.sh")
     # await cavecad_db.connect()
     # await initialize_tables(database)
     yield
 
     # Shutdown works
+    await analysis_jobs.stop()
     logger.info("Shutting down Redis listener...")
     await websocket_conn_man.stop_listening()
-    await pool.disconnect()
+    await redis_manager.kill_pool()
+    shutdown_hash_pool()
     # await database.disconnect()
     # await cavecad_db.disconnect()
 
@@ -31,6 +31,19 @@ class UserUpdate(UserBase):
     password: str | None = Field(default=None, min_length=8, max_length=40)
 
 
+# Bulk provisioning payloads, e.g. HR imports
+class UsersBulkCreate(SQLModel):
+    data: list[UserCreate]
+
+
+class UserBulkUpdate(UserUpdate):
+    id: uuid.UUID
+
+
+class UsersBulkUpdate(SQLModel):
+    data: list[UserBulkUpdate]
+
+
 class UserUpdateMe(SQLModel):
     full_name: str | None = Field(default=None, max_length=255)
     email: EmailStr | None = Field(default=None, max_length=255)
@@ -83,6 +96,10 @@ class Item(ItemBase, table=True):
     owner: User | None = Relationship(back_populates="items")
 
 
+class ItemsBulkCreate(SQLModel):
+    data: list[ItemCreate]
+
+
 # Properties to return via API, id is always required
 class ItemPublic(ItemBase):
     id: uuid.UUID
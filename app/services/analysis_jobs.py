@@ -0,0 +1,378 @@
+import asyncio
+import hashlib
+import json
+import logging
+import uuid
+from dataclasses import asdict
+from datetime import datetime, timedelta, timezone
+from typing import Any
+
+from fastapi.encoders import jsonable_encoder
+
+from app.core.config import settings
+from app.core.redis import get_redis_client, set_many
+from src.history import StepMetrics
+from src.main import BaseDep, MainAgentOutput, notify, run_analysis
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_URL = "https://www.saucedemo.com"
+USERNAME = "standard_user"
+PASSWORD = "secret_sauce"
+CDP_ENDPOINT = "http://localhost:9222"
+
+# Drop an input's claim only if it still names the job we judged dead, so a
+# claim another submit has taken over since is left alone
+_RELEASE_CLAIM = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+# A job record as stored in Redis and returned by the API
+Job = dict[str, Any]
+
+
+class AnalysisQueueFull(Exception):
+    pass
+
+
+def job_topic(job_id: str) -> str:
+    """WebSocket topic a job's progress events are published on"""
+    return f"analysis:{job_id}"
+
+
+def _job_key(job_id: str) -> str:
+    return f"{settings.ANALYSIS_JOB_PREFIX}:{job_id}"
+
+
+def _lease_key(job_id: str) -> str:
+    return f"{settings.ANALYSIS_JOB_PREFIX}:lease:{job_id}"
+
+
+def _input_key(url: str, prompt: str) -> str:
+    digest = hashlib.sha256(f"{url}\n{prompt}".encode()).hexdigest()
+    return f"{settings.ANALYSIS_JOB_PREFIX}:input:{digest}"
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+class AnalysisJobManager:
+    """
+    Runs UX analyses in the background on a bounded pool of worker tasks.
+
+    A submitted job is stored in Redis and queued; workers pick jobs up in
+    order, publish progress on the job's topic and persist the result. Jobs
+    with the same URL and prompt share one record, so asking again returns
+    the queued, running or finished job instead of rerunning the agents.
+    A queued or running job whose worker died (its lease lapsed) or that
+    failed is rerun instead.
+    """
+
+    def __init__(self) -> None:
+        self.queue: asyncio.Queue[str] | None = None
+        self.workers: list[asyncio.Task[None]] = []
+        self.running: set[str] = set()
+        self.pending: set[str] = set()
+        self.heartbeat_task: asyncio.Task[None] | None = None
+        # queue slots taken by submits still persisting their job
+        self.reserved = 0
+
+    async def start(self) -> None:
+        if self.workers:
+            return
+        self.queue = asyncio.Queue(maxsize=settings.ANALYSIS_MAX_QUEUED_JOBS)
+        self.workers = [
+            asyncio.create_task(self._worker(self.queue))
+            for _ in range(settings.ANALYSIS_MAX_CONCURRENT_JOBS)
+        ]
+        self.heartbeat_task = asyncio.create_task(self._heartbeat())
+
+    async def stop(self) -> None:
+        # The queue lives in this process, so whatever it still held is lost
+        interrupted = self.running | self.pending
+        tasks = list(self.workers)
+        if self.heartbeat_task is not None:
+            tasks.append(self.heartbeat_task)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self.workers = []
+        self.heartbeat_task = None
+
+        while self.queue is not None and not self.queue.empty():
+            interrupted.add(self.queue.get_nowait())
+        for job_id in interrupted:
+            try:
+                await self._update(
+                    job_id,
+                    status="failed",
+                    error="Interrupted by server shutdown",
+                    finished_at=_now(),
+                )
+            except Exception as e:
+                logger.error(f"Error marking analysis job {job_id} interrupted: {e}")
+        self.running.clear()
+        self.pending.clear()
+
+    async def submit(self, url: str, prompt: str) -> Job:
+        """Queue an analysis, or return the existing job for the same input"""
+        if self.queue is None:
+            raise RuntimeError("Analysis job manager is not started")
+        redis_client = get_redis_client()
+        url = url or DEFAULT_URL
+        input_key = _input_key(url, prompt)
+
+        while True:
+            existing_id = await redis_client.get(input_key)
+            if existing_id is not None:
+                job = await self.get(existing_id)
+                if job is not None and await self._reusable(job):
+                    return job
+                await redis_client.eval(  # type: ignore[misc]
+                    _RELEASE_CLAIM, 1, input_key, existing_id
+                )
+
+            # Reserve the slot before persisting anything, so a full queue never
+            # leaves behind a queued record that nothing will run
+            if self.queue.qsize() + self.reserved >= settings.ANALYSIS_MAX_QUEUED_JOBS:
+                raise AnalysisQueueFull(
+                    f"{settings.ANALYSIS_MAX_QUEUED_JOBS} analyses are already waiting"
+                )
+            self.reserved += 1
+            try:
+                job = self._new_job(url, prompt)
+                try:
+                    # the lease goes first: a record nobody holds reads as dead
+                    await redis_client.set(
+                        _lease_key(job["id"]), "1", ex=settings.ANALYSIS_JOB_LEASE_TTL
+                    )
+                    await self._save(job)
+                    # of concurrent submits for one input, only one claims it
+                    claimed = await redis_client.set(
+                        input_key, job["id"], ex=settings.ANALYSIS_JOB_TTL, nx=True
+                    )
+                except BaseException:
+                    await self._rollback(job["id"], input_key)
+                    raise
+                if claimed:
+                    self.queue.put_nowait(job["id"])
+                    self.pending.add(job["id"])
+                    return job
+                # another submit got there first: drop ours and return theirs
+                await self._rollback(job["id"], input_key)
+            finally:
+                self.reserved -= 1
+
+    def _new_job(self, url: str, prompt: str) -> Job:
+        job_id = uuid.uuid4().hex
+        return {
+            "id": job_id,
+            "topic": job_topic(job_id),
+            "status": "queued",
+            "url": url,
+            "prompt": prompt,
+            "created_at": _now(),
+            "started_at": None,
+            "finished_at": None,
+            "steps": [],
+            "result": None,
+            "error": None,
+        }
+
+    async def _rollback(self, job_id: str, input_key: str) -> None:
+        """Remove a job that never made it into the queue, and its claim"""
+        redis_client = get_redis_client()
+        try:
+            await redis_client.eval(  # type: ignore[misc]
+                _RELEASE_CLAIM, 1, input_key, job_id
+            )
+            await redis_client.delete(_job_key(job_id), _lease_key(job_id))
+        except Exception as e:
+            logger.error(f"Error rolling back analysis job {job_id}: {e}")
+
+    async def _reusable(self, job: Job) -> bool:
+        """Whether a job can answer a new submit instead of running it again"""
+        if job["status"] == "failed":
+            return False
+        if job["status"] == "completed":
+            return True
+        if await get_redis_client().exists(_lease_key(job["id"])):
+            return True
+        logger.error(f"Analysis job {job['id']} was abandoned while {job['status']}")
+        await self._fail(job["id"], "Abandoned: the worker running it stopped")
+        return False
+
+    async def _heartbeat(self) -> None:
+        """Refresh the lease of every job this process has queued or running"""
+        while True:
+            await asyncio.sleep(settings.ANALYSIS_JOB_HEARTBEAT)
+            held = self.running | self.pending
+            if not held:
+                continue
+            try:
+                await set_many(
+                    get_redis_client(),
+                    {_lease_key(job_id): "1" for job_id in held},
+                    ex=settings.ANALYSIS_JOB_LEASE_TTL,
+                )
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error refreshing analysis job leases: {e}")
+
+    async def get(self, job_id: str) -> Job | None:
+        raw = await get_redis_client().get(_job_key(job_id))
+        return json.loads(raw) if raw is not None else None
+
+    async def _save(self, job: Job) -> None:
+        await get_redis_client().set(
+            _job_key(job["id"]),
+            json.dumps(jsonable_encoder(job)),
+            ex=settings.ANALYSIS_JOB_TTL,
+        )
+
+    async def _update(self, job_id: str, **changes: Any) -> Job | None:
+        job = await self.get(job_id)
+        if job is None:
+            return None
+        job.update(changes)
+        await self._save(job)
+        return job
+
+    async def _publish(self, job_id: str, event: dict[str, Any]) -> None:
+        try:
+            await notify(job_topic(job_id), json.dumps(jsonable_encoder(event)))
+        except Exception as e:
+            logger.error(f"Error publishing progress of analysis job {job_id}: {e}")
+
+    async def _worker(self, queue: asyncio.Queue[str]) -> None:
+        while True:
+            job_id = await queue.get()
+            self.pending.discard(job_id)
+            self.running.add(job_id)
+            try:
+                await self._run(job_id)
+            except Exception as e:
+                logger.error(f"Error running analysis job {job_id}: {e}")
+            finally:
+                self.running.discard(job_id)
+                queue.task_done()
+
+    async def _fail(self, job_id: str, error: str) -> None:
+        await self._update(job_id, status="failed", error=error, finished_at=_now())
+        await self._publish(
+            job_id, {"type": "status", "status": "failed", "error": error}
+        )
+
+    async def _run(self, job_id: str) -> None:
+        job = await self._update(job_id, status="running", started_at=_now())
+        if job is None:
+            logger.error(f"Analysis job {job_id} expired before it ran")
+            return
+        await self._publish(job_id, {"type": "status", "status": "running"})
+        steps: list[dict[str, Any]] = []
+        # kept here so a cancelled run's findings survive it
+        deps = BaseDep(
+            url=job["url"],
+            username=USERNAME,
+            password=PASSWORD,
+            cdp_endpoint=CDP_ENDPOINT,
+            progress_topic=job_topic(job_id),
+            visited_urls=[],
+            ux_report=[],
+            user_journey=[],
+            positive_stuff=[],
+            expectations=[],
+        )
+        last_output: MainAgentOutput | None = None
+
+        async def on_step(step: StepMetrics, output: MainAgentOutput) -> None:
+            nonlocal last_output
+            last_output = output
+            steps.append(asdict(step))
+            await self._update(job_id, steps=steps)
+            await self._publish(
+                job_id,
+                {
+                    "type": "step",
+                    "step": asdict(step),
+                    "visited_urls": output.visited_urls,
+                    "next_url": output.next_url,
+                    "should_continue": output.should_continue,
+                },
+            )
+
+        deadline = settings.ANALYSIS_JOB_TIMEOUT + settings.ANALYSIS_JOB_GRACE
+        try:
+            # run_analysis only checks its timeout between steps; a step that
+            # hangs would otherwise hold the worker forever
+            outcome = await asyncio.wait_for(
+                run_analysis(
+                    url=job["url"],
+                    prompt=job["prompt"],
+                    username=USERNAME,
+                    password=PASSWORD,
+                    cdp_endpoint=CDP_ENDPOINT,
+                    timeout=timedelta(seconds=settings.ANALYSIS_JOB_TIMEOUT),
+                    progress_topic=job_topic(job_id),
+                    on_step=on_step,
+                    deps=deps,
+                ),
+                deadline,
+            )
+        except asyncio.TimeoutError:
+            # cut off mid-step: keep what the finished steps and sub-agents found
+            logger.error(f"Analysis job {job_id} stopped after {deadline} seconds")
+            await self._complete(
+                job_id,
+                deps,
+                last_output,
+                steps,
+                error=f"Stopped after {deadline} seconds, the result is partial",
+            )
+            return
+        except Exception as e:
+            logger.error(f"Analysis job {job_id} failed: {e}")
+            await self._fail(job_id, str(e))
+            return
+
+        await self._complete(job_id, outcome.deps, outcome.output, outcome.steps)
+
+    async def _complete(
+        self,
+        job_id: str,
+        deps: BaseDep,
+        output: MainAgentOutput | None,
+        steps: list[dict[str, Any]],
+        error: str | None = None,
+    ) -> None:
+        result = {
+            "visited_urls": list(dict.fromkeys(deps.visited_urls)),
+            "ux_report": deps.ux_report,
+            "user_journey": deps.user_journey,
+            "expectations": deps.expectations,
+            "positive_stuff": deps.positive_stuff,
+            "final_result": output,
+            "partial": error is not None,
+        }
+        await self._update(
+            job_id,
+            status="completed",
+            steps=steps,
+            result=result,
+            error=error,
+            finished_at=_now(),
+        )
+        if output is not None:
+            await self._publish(
+                job_id, {"type": "final_report", "data": output.model_dump()}
+            )
+        await self._publish(job_id, {"type": "status", "status": "completed"})
+
+
+analysis_jobs = AnalysisJobManager()
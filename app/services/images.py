@@ -9,15 +9,57 @@ from app.core.queries.main import Queries
 import urllib.parse
 from datetime import datetime
 
-from app.services.schema import ImageType
+from app.services.schema import ImageFilter, ImageType
 
 
-async def get_all_images(pagination: Paginated):
+def _escape_like(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def _yes_no(value: bool) -> str:
+    return "Yes" if value else "No"
+
+
+def image_filter_clause(filters: ImageFilter, first_param: int = 3):
+    """
+    WHERE clause and its arguments for the active filters only, so each filter
+    combination gets a plan that can use its index (numbered from first_param)
+    """
+    conditions: list[str] = []
+    args: list = []
+
+    def add(condition: str, value):
+        args.append(value)
+        conditions.append(condition.format(f"${first_param + len(args) - 1}"))
+
+    if filters.status:
+        add("image_status = ANY({}::text[])", filters.status)
+    else:
+        conditions.append("image_status != 'submitted'")
+    if filters.drawpoint:
+        add("drawpoint_name LIKE {}", _escape_like(filters.drawpoint) + "%")
+    if filters.search:
+        # served by the pg_trgm index on drawpoint_name
+        add("drawpoint_name ILIKE {}", f"%{_escape_like(filters.search)}%")
+    if filters.date_from:
+        add("created_date >= {}::date", filters.date_from)
+    if filters.date_to:
+        add("created_date < {}::date + 1", filters.date_to)
+    if filters.edited is not None:
+        add("is_edited = {}", _yes_no(filters.edited))
+    if filters.has_bund is not None:
+        add("has_bund = {}", _yes_no(filters.has_bund))
+
+    return " AND ".join(conditions), args
+
+
+async def get_all_images(pagination: Paginated, filters: ImageFilter):
     query = Queries()
 
     base_url = f"{settings.CONTENT_URL}/"
+    where, args = image_filter_clause(filters)
     images = await db_pg.execute_query(
-        query.get_images, pagination.limit, pagination.skip
+        query.get_images.format(where=where), pagination.limit, pagination.skip, *args
     )
 
     results = []
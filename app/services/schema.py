@@ -1,5 +1,8 @@
 from dataclasses import dataclass
-from datetime import datetime
+from datetime import date, datetime
+from typing import Literal
+
+from pydantic import BaseModel, Field
 
 
 @dataclass
@@ -21,3 +24,26 @@ class ImageType:
     imagetaken_date: datetime
     created_date: datetime
     updated_date: datetime
+
+
+class StatsFilter(BaseModel):
+    period: Literal["day", "week", "month", "quarter", "year"] = Field(
+        "month", description="Bucket size for the per-period averages"
+    )
+    date_from: date | None = Field(None, description="First upload day (inclusive)")
+    date_to: date | None = Field(None, description="Last upload day (inclusive)")
+    drawpoint_name: str | None = Field(None, description="Limit to one drawpoint")
+
+
+class ImageFilter(BaseModel):
+    drawpoint: str | None = Field(None, description="Drawpoint name prefix")
+    search: str | None = Field(
+        None, description="Case-insensitive match anywhere in the drawpoint name"
+    )
+    status: list[str] = Field(
+        [], description="Image statuses to include (default: all but submitted)"
+    )
+    date_from: date | None = Field(None, description="First upload day (inclusive)")
+    date_to: date | None = Field(None, description="Last upload day (inclusive)")
+    edited: bool | None = Field(None, description="Only edited / unedited images")
+    has_bund: bool | None = Field(None, description="Only images with / without bund")
@@ -0,0 +1,89 @@
+import logging
+from datetime import datetime
+from typing import Any, TypedDict
+
+from app.core.config import settings
+from app.core.postgres import db_pg
+from app.core.queries.main import Queries
+from app.services.schema import StatsFilter
+
+logger = logging.getLogger(__name__)
+
+AREA_FIELDS = (
+    "fine_area",
+    "small_area",
+    "medium_area",
+    "large_area",
+    "oversized_area",
+)
+
+
+class StatsResults(TypedDict):
+    by_drawpoint_period: list[dict[str, Any]]
+    by_drawpoint: list[dict[str, Any]]
+    by_period: list[dict[str, Any]]
+    overall: dict[str, Any] | None
+
+
+def _format_row(row: Any) -> dict[str, Any]:
+    return {
+        "drawpoint_name": row["drawpoint_name"],
+        "period": (
+            row["period"].isoformat()
+            if isinstance(row["period"], datetime)
+            else row["period"]
+        ),
+        "image_count": int(row["image_count"]),
+        **{
+            field: float(row[field]) if row[field] is not None else None
+            for field in AREA_FIELDS
+        },
+    }
+
+
+async def get_fragmentation_stats(filters: StatsFilter) -> StatsResults:
+    query = Queries()
+
+    sql = (
+        query.get_stats_from_view
+        if settings.STATS_MATERIALIZED_VIEW
+        else query.get_stats
+    )
+    rows = await db_pg.execute_query(
+        sql,
+        filters.period,
+        filters.date_from,
+        filters.date_to,
+        filters.drawpoint_name,
+    )
+
+    # one GROUPING SETS result, split back into its rollups
+    results: StatsResults = {
+        "by_drawpoint_period": [],
+        "by_drawpoint": [],
+        "by_period": [],
+        "overall": None,
+    }
+    for row in rows:
+        formatted = _format_row(row)
+        if row["all_drawpoints"] and row["all_periods"]:
+            results["overall"] = formatted
+        elif row["all_drawpoints"]:
+            results["by_period"].append(formatted)
+        elif row["all_periods"]:
+            results["by_drawpoint"].append(formatted)
+        else:
+            results["by_drawpoint_period"].append(formatted)
+    return results
+
+
+async def refresh_stats_view() -> None:
+    """Bring fragmentation_stats_daily up to date; no-op when the view isn't used"""
+    if not settings.STATS_MATERIALIZED_VIEW:
+        return
+    query = Queries()
+    try:
+        await db_pg.execute_command(query.refresh_stats_view)
+    except Exception as e:
+        # stale stats are better than a failed submission
+        logger.error(f"Failed to refresh stats view: {e}")
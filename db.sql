@@ -36,4 +36,212 @@ CREATE TABLE fragmentation_images (
     imagetaken_date TIMESTAMP WITHOUT TIME ZONE NULL,
     created_date TIMESTAMP WITHOUT TIME ZONE NOT NULL,
     updated_date TIMESTAMP WITHOUT TIME ZONE  NULL
-);
\ No newline at end of file
+);
+-- Approved values applied per image, kept in sync by the triggers below.
+-- Everything for it is idempotent, so running this file again migrates an
+-- existing database.
+CREATE TABLE IF NOT EXISTS effective_fragmentation (
+    id INT PRIMARY KEY,
+    drawpoint_name VARCHAR(255),
+    approved_drawpoint_name VARCHAR(255),
+    created_date TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+    fine_area REAL,
+    small_area REAL,
+    medium_area REAL,
+    large_area REAL,
+    oversized_area REAL,
+    raw_image_path VARCHAR(500),
+    predicted_image_path VARCHAR(500),
+    bbox_image_path VARCHAR(500),
+    wetness SMALLINT,
+    dp_condition SMALLINT,
+    drawpointConditionComment VARCHAR(1000),
+    fragmentationComment VARCHAR(1000),
+    wetnessComment VARCHAR(1000),
+    is_edited VARCHAR(3),
+    image_status VARCHAR(20),
+    has_bund VARCHAR(3),
+    imagetaken_date TIMESTAMP WITHOUT TIME ZONE,
+    username VARCHAR(500) NOT NULL DEFAULT ''
+);
+
+CREATE INDEX IF NOT EXISTS effective_fragmentation_status_created
+    ON effective_fragmentation (image_status, created_date DESC);
+
+-- Triggers keep effective_fragmentation in sync with both source tables
+-- (same SQL as app.core.db.EFFECTIVE_FRAGMENTATION_SYNC); latest approval wins
+CREATE OR REPLACE FUNCTION refresh_effective_fragmentation(target_id INT)
+RETURNS void AS $$
+BEGIN
+    INSERT INTO effective_fragmentation (
+        id, drawpoint_name, approved_drawpoint_name, created_date,
+        fine_area, small_area, medium_area, large_area, oversized_area,
+        raw_image_path, predicted_image_path, bbox_image_path,
+        wetness, dp_condition,
+        drawpointconditioncomment, fragmentationcomment, wetnesscomment,
+        is_edited, image_status, has_bund, imagetaken_date, username
+    )
+    SELECT DISTINCT ON (r.id)
+        r.id,
+        COALESCE(r.edited_dp_name, r.drawpoint_name),
+        COALESCE(r.edited_dp_name, f.drawpoint_name),
+        r.created_date,
+        COALESCE(f.new_fine_area, r.fine_area),
+        COALESCE(f.new_small_area, r.small_area),
+        COALESCE(f.new_medium_area, r.medium_area),
+        COALESCE(f.new_large_area, r.large_area),
+        COALESCE(f.new_oversized_area, r.oversized_area),
+        r.raw_image_path,
+        r.predicted_image_path,
+        COALESCE(r.bbox_image_path, r.raw_image_path),
+        f.wetness,
+        f.dp_condition,
+        f.drawpointconditioncomment,
+        f.fragmentationcomment,
+        f.wetnesscomment,
+        r.is_edited,
+        r.image_status,
+        r.has_bund,
+        r.imagetaken_date,
+        COALESCE(f.username, '')
+    FROM fragmentation_images r
+    LEFT JOIN approved_fragmentation f ON r.id = f.image_id
+    WHERE r.id = target_id
+    ORDER BY r.id, f.id DESC
+    ON CONFLICT (id) DO UPDATE SET
+        drawpoint_name = EXCLUDED.drawpoint_name,
+        approved_drawpoint_name = EXCLUDED.approved_drawpoint_name,
+        created_date = EXCLUDED.created_date,
+        fine_area = EXCLUDED.fine_area,
+        small_area = EXCLUDED.small_area,
+        medium_area = EXCLUDED.medium_area,
+        large_area = EXCLUDED.large_area,
+        oversized_area = EXCLUDED.oversized_area,
+        raw_image_path = EXCLUDED.raw_image_path,
+        predicted_image_path = EXCLUDED.predicted_image_path,
+        bbox_image_path = EXCLUDED.bbox_image_path,
+        wetness = EXCLUDED.wetness,
+        dp_condition = EXCLUDED.dp_condition,
+        drawpointconditioncomment = EXCLUDED.drawpointconditioncomment,
+        fragmentationcomment = EXCLUDED.fragmentationcomment,
+        wetnesscomment = EXCLUDED.wetnesscomment,
+        is_edited = EXCLUDED.is_edited,
+        image_status = EXCLUDED.image_status,
+        has_bund = EXCLUDED.has_bund,
+        imagetaken_date = EXCLUDED.imagetaken_date,
+        username = EXCLUDED.username;
+
+    -- image is gone, so is its effective row
+    IF NOT FOUND THEN
+        DELETE FROM effective_fragmentation WHERE id = target_id;
+    END IF;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION sync_effective_from_images()
+RETURNS trigger AS $$
+BEGIN
+    IF TG_OP <> 'INSERT' THEN
+        PERFORM refresh_effective_fragmentation(OLD.id);
+    END IF;
+    IF TG_OP = 'INSERT' OR (TG_OP = 'UPDATE' AND NEW.id IS DISTINCT FROM OLD.id) THEN
+        PERFORM refresh_effective_fragmentation(NEW.id);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION sync_effective_from_approved()
+RETURNS trigger AS $$
+BEGIN
+    IF TG_OP <> 'INSERT' THEN
+        PERFORM refresh_effective_fragmentation(OLD.image_id);
+    END IF;
+    IF TG_OP = 'INSERT' OR (TG_OP = 'UPDATE' AND NEW.image_id IS DISTINCT FROM OLD.image_id) THEN
+        PERFORM refresh_effective_fragmentation(NEW.image_id);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS effective_fragmentation_images ON fragmentation_images;
+CREATE TRIGGER effective_fragmentation_images
+    AFTER INSERT OR UPDATE OR DELETE ON fragmentation_images
+    FOR EACH ROW EXECUTE FUNCTION sync_effective_from_images();
+
+DROP TRIGGER IF EXISTS effective_fragmentation_approved ON approved_fragmentation;
+CREATE TRIGGER effective_fragmentation_approved
+    AFTER INSERT OR UPDATE OR DELETE ON approved_fragmentation
+    FOR EACH ROW EXECUTE FUNCTION sync_effective_from_approved();
+
+-- Backfill after the triggers are live so nothing written meanwhile is missed;
+-- rows the triggers already wrote are left alone
+INSERT INTO effective_fragmentation (
+    id, drawpoint_name, approved_drawpoint_name, created_date,
+    fine_area, small_area, medium_area, large_area, oversized_area,
+    raw_image_path, predicted_image_path, bbox_image_path,
+    wetness, dp_condition,
+    drawpointconditioncomment, fragmentationcomment, wetnesscomment,
+    is_edited, image_status, has_bund, imagetaken_date, username
+)
+SELECT DISTINCT ON (r.id)
+    r.id,
+    COALESCE(r.edited_dp_name, r.drawpoint_name),
+    COALESCE(r.edited_dp_name, f.drawpoint_name),
+    r.created_date,
+    COALESCE(f.new_fine_area, r.fine_area),
+    COALESCE(f.new_small_area, r.small_area),
+    COALESCE(f.new_medium_area, r.medium_area),
+    COALESCE(f.new_large_area, r.large_area),
+    COALESCE(f.new_oversized_area, r.oversized_area),
+    r.raw_image_path,
+    r.predicted_image_path,
+    COALESCE(r.bbox_image_path, r.raw_image_path),
+    f.wetness,
+    f.dp_condition,
+    f.drawpointconditioncomment,
+    f.fragmentationcomment,
+    f.wetnesscomment,
+    r.is_edited,
+    r.image_status,
+    r.has_bund,
+    r.imagetaken_date,
+    COALESCE(f.username, '')
+FROM fragmentation_images r
+LEFT JOIN approved_fragmentation f ON r.id = f.image_id
+ORDER BY r.id, f.id DESC
+ON CONFLICT (id) DO NOTHING;
+
+-- /images filters: drawpoint prefix, substring search, status/edited/bund
+CREATE INDEX IF NOT EXISTS effective_fragmentation_drawpoint_prefix
+    ON effective_fragmentation (drawpoint_name varchar_pattern_ops);
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+CREATE INDEX IF NOT EXISTS effective_fragmentation_drawpoint_trgm
+    ON effective_fragmentation USING gin (drawpoint_name gin_trgm_ops);
+
+CREATE INDEX IF NOT EXISTS effective_fragmentation_status_edited_bund
+    ON effective_fragmentation (image_status, is_edited, has_bund, created_date DESC);
+
+-- Optional: daily rollup behind /stats when STATS_MATERIALIZED_VIEW is enabled
+CREATE MATERIALIZED VIEW IF NOT EXISTS fragmentation_stats_daily AS
+SELECT
+    drawpoint_name,
+    date_trunc('day', created_date) AS day,
+    COUNT(*) AS image_count,
+    SUM(fine_area) AS fine_area_sum,
+    COUNT(fine_area) AS fine_area_count,
+    SUM(small_area) AS small_area_sum,
+    COUNT(small_area) AS small_area_count,
+    SUM(medium_area) AS medium_area_sum,
+    COUNT(medium_area) AS medium_area_count,
+    SUM(large_area) AS large_area_sum,
+    COUNT(large_area) AS large_area_count,
+    SUM(oversized_area) AS oversized_area_sum,
+    COUNT(oversized_area) AS oversized_area_count
+FROM effective_fragmentation
+WHERE image_status = 'submitted'
+GROUP BY 1, 2;
+
+CREATE UNIQUE INDEX IF NOT EXISTS fragmentation_stats_daily_key
+    ON fragmentation_stats_daily (drawpoint_name, day);
@@ -0,0 +1,184 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from crawl4ai import AsyncWebCrawler, BrowserConfig
+from playwright.async_api import Browser, BrowserContext, Page, async_playwright
+
+from src.frontier import canonicalize_url
+
+
+@dataclass
+class SessionMetrics:
+    setup_seconds: float = 0.0  # connecting crawl4ai / Playwright, paid once
+    crawler_uses: int = 0
+    pages_created: int = 0
+    page_uses: int = 0
+
+    @property
+    def setups_avoided(self) -> int:
+        """Browser connections the session saved compared to one per tool call"""
+        return max(0, self.crawler_uses - 1)
+
+    def as_dict(self) -> Dict:
+        return {
+            "setup_ms": round(self.setup_seconds * 1000, 1),
+            "crawler_uses": self.crawler_uses,
+            "pages_created": self.pages_created,
+            "page_uses": self.page_uses,
+            "setups_avoided": self.setups_avoided,
+        }
+
+
+class BrowserSession:
+    """
+    One CDP connection for a whole analysis run, shared by every crawler tool
+    (an empty cdp_url launches a local browser instead).
+
+    Holds a long-lived crawl4ai crawler (markdown, LLM extraction) and a pool of
+    Playwright tabs in the browser's existing context, so the user's logged-in
+    cookies apply. Both are connected lazily on first use and closed together.
+
+    Tool results for the current step are remembered per (kind, URL) so the
+    tools don't re-render a page they just saw. They're never shared across
+    sessions, since the pages depend on who's logged in, and new_step() drops
+    them because the agent may have changed the page (cart, checkout) since.
+    """
+
+    def __init__(self, cdp_url: str, pool_size: int = 4):
+        self.cdp_url = cdp_url
+        self.pool_size = pool_size
+        self.metrics = SessionMetrics()
+        self._crawler: Optional[AsyncWebCrawler] = None
+        self._playwright = None
+        self._browser: Optional[Browser] = None
+        self._context: Optional[BrowserContext] = None
+        # one slot per tab: a discarded tab gives its slot back, so a waiter
+        # opens a fresh one instead of waiting on an idle tab that never comes
+        self._slots = asyncio.Semaphore(pool_size)
+        self._idle: List[Page] = []
+        self._pages: List[Page] = []
+        self._lock = asyncio.Lock()
+        self._remembered: Dict[Tuple[str, str], Any] = {}
+
+    def recall(self, kind: str, url: str) -> Any:
+        return self._remembered.get((kind, canonicalize_url(url)))
+
+    def remember(self, kind: str, url: str, value: Any) -> None:
+        self._remembered[(kind, canonicalize_url(url))] = value
+
+    def new_step(self) -> None:
+        """Forget remembered pages, the agent may have interacted with them since"""
+        self._remembered.clear()
+
+    async def crawler(self) -> AsyncWebCrawler:
+        async with self._lock:
+            if self._crawler is None:
+                started = time.perf_counter()
+                crawler = AsyncWebCrawler(config=BrowserConfig(cdp_url=self.cdp_url))
+                await crawler.start()
+                self._crawler = crawler
+                self.metrics.setup_seconds += time.perf_counter() - started
+        self.metrics.crawler_uses += 1
+        return self._crawler
+
+    async def _ensure_context(self) -> BrowserContext:
+        if self._context is None:
+            started = time.perf_counter()
+            self._playwright = await async_playwright().start()
+            if self.cdp_url:
+                self._browser = await self._playwright.chromium.connect_over_cdp(
+                    self.cdp_url
+                )
+            else:
+                self._browser = await self._playwright.chromium.launch()
+            contexts = self._browser.contexts
+            self._context = (
+                contexts[0] if contexts else await self._browser.new_context()
+            )
+            self.metrics.setup_seconds += time.perf_counter() - started
+        return self._context
+
+    @asynccontextmanager
+    async def page(self) -> AsyncIterator[Page]:
+        """A pooled tab; returned to the pool afterwards unless something broke"""
+        await self._slots.acquire()
+        try:
+            if self._idle:
+                page = self._idle.pop()
+            else:
+                async with self._lock:
+                    context = await self._ensure_context()
+                page = await context.new_page()
+                self._pages.append(page)
+                self.metrics.pages_created += 1
+        except BaseException:
+            self._slots.release()
+            raise
+        self.metrics.page_uses += 1
+        try:
+            yield page
+        except BaseException:
+            if page in self._pages:  # not already closed by close()
+                self._pages.remove(page)
+            try:
+                await page.close()
+            except Exception:
+                pass
+            raise
+        else:
+            self._idle.append(page)
+        finally:
+            self._slots.release()
+
+    async def close(self) -> None:
+        async with self._lock:
+            for page in self._pages:
+                try:
+                    await page.close()
+                except Exception:
+                    pass
+            self._pages.clear()
+            self._idle.clear()
+            if self._crawler is not None:
+                await self._crawler.close()
+                self._crawler = None
+            # don't close the user's browser context, only our connection to it
+            if self._browser is not None:
+                await self._browser.close()
+            if self._playwright is not None:
+                await self._playwright.stop()
+            self._context = self._browser = self._playwright = None
+
+
+current_session: ContextVar[Optional[BrowserSession]] = ContextVar(
+    "browser_session", default=None
+)
+
+
+@asynccontextmanager
+async def browser_session(
+    cdp_url: str, pool_size: int = 4
+) -> AsyncIterator[BrowserSession]:
+    """
+    Make a BrowserSession current for everything awaited inside the block.
+    Re-entering with the same cdp_url (e.g. a tool inside an analysis run)
+    reuses the open session; outside a run every call gets its own.
+    """
+    session = current_session.get()
+    if session is not None and session.cdp_url == cdp_url:
+        yield session
+        return
+    session = BrowserSession(cdp_url, pool_size=pool_size)
+    token = current_session.set(session)
+    try:
+        yield session
+    finally:
+        current_session.reset(token)
+        await session.close()
+        print(
+            f"[browser] session for {cdp_url or 'local'}: {session.metrics.as_dict()}"
+        )
@@ -0,0 +1,205 @@
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Mapping, Optional
+
+import httpx
+
+from src.frontier import canonicalize_url
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS crawl_cache (
+    key TEXT PRIMARY KEY,
+    url TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    html TEXT NOT NULL DEFAULT '',
+    markdown TEXT NOT NULL DEFAULT '',
+    data TEXT,
+    content_hash TEXT NOT NULL,
+    etag TEXT,
+    last_modified TEXT,
+    fetched_at REAL NOT NULL
+);
+"""
+
+COLUMNS = (
+    "url",
+    "kind",
+    "html",
+    "markdown",
+    "data",
+    "content_hash",
+    "etag",
+    "last_modified",
+    "fetched_at",
+)
+
+
+def content_hash(html: str) -> str:
+    return hashlib.sha256(html.encode("utf-8", "replace")).hexdigest()
+
+
+@dataclass
+class CachedPage:
+    url: str
+    kind: str
+    html: str
+    markdown: str
+    data: Any  # links for pages/markdown, the LLM output for extractions
+    content_hash: str
+    etag: Optional[str]
+    last_modified: Optional[str]
+    fetched_at: float
+
+
+class CrawlCache:
+    """
+    SQLite cache of crawled pages, one row per (kind, canonical URL), where kind
+    separates what was stored ("page", "markdown", "extraction", ...). Each row
+    carries a hash of its content so callers can tell identical pages apart
+    from changed ones.
+
+    Entries younger than `ttl` are served as-is. Older ones are revalidated with
+    a conditional GET (If-None-Match / If-Modified-Since) when the page sent an
+    ETag or Last-Modified, and served again on 304; otherwise they're a miss.
+    """
+
+    def __init__(self, path: str, ttl: float = 3600.0):
+        self.path = path
+        self.ttl = ttl
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._client: Optional[httpx.AsyncClient] = None
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    @staticmethod
+    def _key(url: str, kind: str) -> str:
+        return f"{kind}:{canonicalize_url(url)}"
+
+    def _read(self, key: str) -> Optional[CachedPage]:
+        with self._lock:
+            row = (
+                self._connection()
+                .execute(
+                    f"SELECT {', '.join(COLUMNS)} FROM crawl_cache WHERE key = ?",
+                    (key,),
+                )
+                .fetchone()
+            )
+        if row is None:
+            return None
+        entry = CachedPage(*row)
+        entry.data = json.loads(entry.data) if entry.data else None
+        return entry
+
+    def _write(self, key: str, entry: CachedPage) -> None:
+        values = (
+            entry.url,
+            entry.kind,
+            entry.html,
+            entry.markdown,
+            json.dumps(entry.data, default=str),
+            entry.content_hash,
+            entry.etag,
+            entry.last_modified,
+            entry.fetched_at,
+        )
+        with self._lock:
+            conn = self._connection()
+            conn.execute(
+                f"INSERT OR REPLACE INTO crawl_cache (key, {', '.join(COLUMNS)}) "
+                f"VALUES (?, {', '.join('?' * len(COLUMNS))})",
+                (key, *values),
+            )
+            conn.commit()
+
+    def _touch(self, key: str, fetched_at: float) -> None:
+        with self._lock:
+            conn = self._connection()
+            conn.execute(
+                "UPDATE crawl_cache SET fetched_at = ? WHERE key = ?",
+                (fetched_at, key),
+            )
+            conn.commit()
+
+    async def _not_modified(self, entry: CachedPage) -> bool:
+        headers = {}
+        if entry.etag:
+            headers["If-None-Match"] = entry.etag
+        if entry.last_modified:
+            headers["If-Modified-Since"] = entry.last_modified
+        if not headers:
+            return False
+        if self._client is None:
+            self._client = httpx.AsyncClient(follow_redirects=True, timeout=10.0)
+        try:
+            response = await self._client.get(entry.url, headers=headers)
+        except httpx.HTTPError:
+            return False
+        return response.status_code == 304
+
+    async def get(self, url: str, kind: str = "page") -> Optional[CachedPage]:
+        """The cached entry if still fresh (or revalidated just now), else None"""
+        key = self._key(url, kind)
+        entry = await asyncio.to_thread(self._read, key)
+        if entry is None:
+            return None
+        if time.time() - entry.fetched_at < self.ttl:
+            return entry
+        if await self._not_modified(entry):
+            entry.fetched_at = time.time()
+            await asyncio.to_thread(self._touch, key, entry.fetched_at)
+            return entry
+        return None
+
+    async def put(
+        self,
+        url: str,
+        kind: str = "page",
+        html: str = "",
+        markdown: str = "",
+        data: Any = None,
+        headers: Optional[Mapping[str, str]] = None,
+    ) -> CachedPage:
+        headers = {k.lower(): v for k, v in (headers or {}).items()}
+        entry = CachedPage(
+            url=url,
+            kind=kind,
+            html=html,
+            markdown=markdown,
+            data=data,
+            content_hash=content_hash(html or markdown),
+            etag=headers.get("etag"),
+            last_modified=headers.get("last-modified"),
+            fetched_at=time.time(),
+        )
+        await asyncio.to_thread(self._write, self._key(url, kind), entry)
+        return entry
+
+    async def close(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+crawl_cache = CrawlCache(
+    path=os.getenv("CRAWL_CACHE_PATH", "./.cache/crawl.sqlite"),
+    ttl=float(os.getenv("CRAWL_CACHE_TTL", "3600")),
+)
@@ -1,23 +1,42 @@
 import asyncio
 import json
 import os
-from base64 import b64decode
-from collections import deque
-from typing import Dict, List, Optional, Set, Tuple
-from urllib.parse import urljoin, urlparse
+import time
+from dataclasses import dataclass, field
+from typing import (
+    Awaitable,
+    Callable,
+    Dict,
+    List,
+    Literal,
+    Optional,
+    Set,
+    Tuple,
+    Union,
+)
+from urllib.parse import urlparse
 
-from bs4 import BeautifulSoup
+import aiofiles
 from crawl4ai import (
-    AsyncWebCrawler,
-    BrowserConfig,
     CacheMode,
     CrawlerRunConfig,
     LLMConfig,
     LLMExtractionStrategy,
 )
-from playwright.async_api import async_playwright
 from pydantic import BaseModel, Field
 
+from src.browser import browser_session
+from src.cache import CrawlCache, content_hash, crawl_cache
+from src.fetchers import (
+    CDPPageFetcher,
+    FetchedPage,
+    FetcherKind,
+    PageFetcher,
+    make_fetcher,
+)
+from src.frontier import CrawlFrontier, canonicalize_url
+from src.page_analysis import analyze_page, is_same_origin
+
 
 class ExtractedData(BaseModel):
     urls: List[str] = Field(..., description="List of URLs to visit")
@@ -54,10 +73,14 @@ async def complex_web_extraction(cdp_url: str, url_to_crawl: str):
         extraction_strategy=llm_strategy, cache_mode=CacheMode.BYPASS
     )
 
-    # 3. Create a browser config if needed
-    browser_cfg = BrowserConfig(headless=True, cdp_url=cdp_url)
+    async with browser_session(cdp_url) as session:
+        # the LLM pass is the expensive part, reuse it within the current step
+        cached = session.recall("extraction", url_to_crawl)
+        if cached is not None:
+            print("Extracted items (cached):", cached)
+            return cached
 
-    async with AsyncWebCrawler(config=browser_cfg) as crawler:
+        crawler = await session.crawler()
         # 4. Let's say we want to crawl a single page
         result = await crawler.arun(url=url_to_crawl, config=crawl_config)
 
@@ -68,67 +91,112 @@ async def complex_web_extraction(cdp_url: str, url_to_crawl: str):
 
             # 6. Show usage stats
             llm_strategy.show_usage()  # prints token usage
+            session.remember("extraction", url_to_crawl, data)
+            return data
         else:
             print("Error:", result.error_message)  # type: ignore
 
 
-async def take_screenshot(url: str, cdp_url: str):
-    await save_screenshot_with_different_viewports(
-        url=url,
-        cdp_url=cdp_url,
-        viewports=[
-            (1920, 1080),  # Desktop
-            (375, 667),  # Mobile
-            (768, 1024),  # Tablet (iPad portrait)
-            (1024, 768),  # Tablet (iPad landscape)
-        ],
+# named viewport sets for take_screenshot, (width, height) in CSS pixels
+VIEWPORT_SETS: Dict[str, List[Tuple[int, int]]] = {
+    "default": [
+        (1920, 1080),  # Desktop
+        (375, 667),  # Mobile
+        (768, 1024),  # Tablet (iPad portrait)
+        (1024, 768),  # Tablet (iPad landscape)
+    ],
+    "desktop": [(1920, 1080), (1366, 768)],
+    "mobile": [(375, 667), (390, 844), (412, 915)],
+    "tablet": [(768, 1024), (1024, 768)],
+}
+
+ScreenshotFormat = Literal["png", "webp"]
+
+
+async def take_screenshot(
+    url: str,
+    cdp_url: str,
+    viewports: Union[str, List[Tuple[int, int]]] = "default",
+    image_format: ScreenshotFormat = "png",
+) -> List[str]:
+    if isinstance(viewports, str):
+        viewports = VIEWPORT_SETS[viewports]
+    return await save_screenshot_with_different_viewports(
+        url=url, cdp_url=cdp_url, viewports=viewports, image_format=image_format
     )
 
 
-async def save_screenshot_with_different_viewports(
-    url: str, cdp_url: str, viewports: List[Tuple[int, int]]
-):
-    run_config = CrawlerRunConfig(
-        cache_mode=CacheMode.BYPASS,
-        screenshot=True,
-        pdf=False,
-    )
-    for width, height in viewports:
-        async with AsyncWebCrawler(
-            config=BrowserConfig(
-                cdp_url=cdp_url, viewport_height=height, viewport_width=width
-            )
-        ) as crawler:
-            result = await crawler.arun(
-                url=url,
-                config=run_config,
-            )
-            if result.success:  # type: ignore
-                print(f"Screenshot data present: {result.screenshot is not None}")  # type: ignore
-                print(f"PDF data present: {result.pdf is not None}")  # type: ignore
-
-                if result.screenshot:  # type: ignore
-                    print(f"[OK] Screenshot captured, size: {len(result.screenshot)} bytes")  # type: ignore
-                    # Extract name from URL and create output path
-                    name = urlparse(url).netloc.replace(".", "_")
-                    output_dir = "./output"
-                    os.makedirs(output_dir, exist_ok=True)
-                    output_path = os.path.join(
-                        output_dir, f"{name}_{width}x{height}.png"
-                    )
+def _encode_webp(png: bytes) -> bytes:
+    from io import BytesIO
 
-                    with open(output_path, "wb") as f:
-                        f.write(b64decode(result.screenshot))  # type: ignore
-                else:
-                    print("[WARN] Screenshot data is None.")
+    from PIL import Image
 
-            else:
-                print("[ERROR]", result.error_message)  # type: ignore
+    output = BytesIO()
+    Image.open(BytesIO(png)).save(output, format="WEBP", quality=80, method=4)
+    return output.getvalue()
 
 
-async def get_clean_markdown(url: str, cdp_url: str):
-    browser_cfg = BrowserConfig(cdp_url=cdp_url)
+async def save_screenshot_with_different_viewports(
+    url: str,
+    cdp_url: str,
+    viewports: List[Tuple[int, int]],
+    image_format: ScreenshotFormat = "png",
+) -> List[str]:
+    """
+    Capture every viewport concurrently, each in its own tab of the shared
+    browser session, and return the paths written. WebP needs Pillow; without
+    it the screenshots are saved as PNG.
+    """
+    if image_format == "webp":
+        try:
+            import PIL  # noqa: F401
+        except ImportError:
+            print("[WARN] Pillow is not installed, saving screenshots as PNG")
+            image_format = "png"
+
+    name = urlparse(url).netloc.replace(".", "_")
+    output_dir = "./output"
+    os.makedirs(output_dir, exist_ok=True)
+
+    async def capture(session, width: int, height: int) -> Optional[str]:
+        try:
+            async with session.page() as page:
+                await page.set_viewport_size({"width": width, "height": height})
+                await page.goto(url)
+                await page.wait_for_load_state("domcontentloaded")
+                screenshot = await page.screenshot(full_page=True)
+        except Exception as e:
+            print(f"[ERROR] {width}x{height}:", e)
+            return None
+        print(f"[OK] Screenshot captured, size: {len(screenshot)} bytes")
+
+        extension = image_format
+        if image_format == "webp":
+            try:
+                # image encoding is CPU-bound, keep it off the event loop
+                screenshot = await asyncio.to_thread(_encode_webp, screenshot)
+            except Exception as e:
+                # e.g. full-page captures taller than WebP's 16383 px limit
+                print(f"[WARN] {width}x{height}: WebP encoding failed, saving PNG:", e)
+                extension = "png"
+        output_path = os.path.join(output_dir, f"{name}_{width}x{height}.{extension}")
+        try:
+            async with aiofiles.open(output_path, "wb") as f:
+                await f.write(screenshot)
+        except Exception as e:
+            print(f"[ERROR] {width}x{height}: writing {output_path} failed:", e)
+            return None
+        return output_path
+
+    # a standalone session gets one tab per viewport so no capture waits for another
+    async with browser_session(cdp_url, pool_size=len(viewports)) as session:
+        paths = await asyncio.gather(
+            *(capture(session, width, height) for width, height in viewports)
+        )
+    return [path for path in paths if path]
+
 
+async def get_clean_markdown(url: str, cdp_url: str):
     run_cfg = CrawlerRunConfig(
         cache_mode=CacheMode.BYPASS,
         excluded_tags=["script", "style"],
@@ -136,7 +204,12 @@ async def get_clean_markdown(url: str, cdp_url: str):
         screenshot=False,
         # stream=True,
     )
-    async with AsyncWebCrawler(config=browser_cfg) as crawler:
+    async with browser_session(cdp_url) as session:
+        cached = session.recall("markdown", url)
+        if cached is not None:
+            return cached
+
+        crawler = await session.crawler()
         result = await crawler.arun(url=url, config=run_cfg)
         _response = {
             "markdown": result.markdown,  # type: ignore
@@ -144,46 +217,140 @@ async def get_clean_markdown(url: str, cdp_url: str):
         }
 
         print(_response)
+        if result.success:  # type: ignore
+            session.remember("markdown", url, _response)
         return _response
 
 
-def _is_same_origin(url: str, root: str) -> bool:
-    parsed_url = urlparse(url)
-    parsed_root = urlparse(root)
-    return (
-        parsed_url.scheme in {"http", "https"}
-        and parsed_url.netloc == parsed_root.netloc
-    )
+@dataclass
+class CrawlMetrics:
+    """Live counters for one crawl_site run; safe to read while it's running"""
+
+    started_at: float = field(default_factory=time.monotonic)
+    finished_at: Optional[float] = None
+    pages: int = 0
+    errors: int = 0
+    in_flight: int = 0
+    peak_in_flight: int = 0
+    queue_depth: int = 0
+    peak_queue_depth: int = 0
+
+    @property
+    def elapsed(self) -> float:
+        return (self.finished_at or time.monotonic()) - self.started_at
+
+    @property
+    def pages_per_sec(self) -> float:
+        return self.pages / self.elapsed if self.elapsed > 0 else 0.0
+
+    def as_dict(self) -> Dict:
+        return {
+            "pages": self.pages,
+            "errors": self.errors,
+            "in_flight": self.in_flight,
+            "peak_in_flight": self.peak_in_flight,
+            "queue_depth": self.queue_depth,
+            "peak_queue_depth": self.peak_queue_depth,
+            "elapsed": round(self.elapsed, 3),
+            "pages_per_sec": round(self.pages_per_sec, 2),
+        }
 
 
-def _extract_links(html: str, base_url: str) -> Tuple[List[str], List[str]]:
-    internal: List[str] = []
-    external: List[str] = []
-    try:
-        soup = BeautifulSoup(html or "", "html.parser")
-    except Exception:
-        return internal, external
-
-    for a in soup.find_all("a", href=True):
-        href = a.get("href")
-        absolute = urljoin(base_url, href)  # type: ignore
-        if _is_same_origin(absolute, base_url):
-            if absolute not in internal:
-                internal.append(absolute)
-        else:
-            if absolute not in external:
-                external.append(absolute)
-    return internal, external
+FetchPage = Callable[[str], Awaitable[Tuple[str, Dict]]]
+
 
+async def _crawl_with_workers(
+    start_url: str,
+    fetch: FetchPage,
+    frontier: CrawlFrontier,
+    max_pages: int,
+    concurrency: int,
+    metrics: CrawlMetrics,
+) -> List[Dict]:
+    """
+    Scheduling core shared by every crawl backend: `concurrency` long-lived
+    workers each pull the next URL from the frontier as soon as their previous
+    fetch finishes, so one slow page never holds the others back.
+    """
+    visited: Set[str] = set()
+    seen_content: Set[str] = set()
+    results: List[Dict] = []
+    # pages fetched or being fetched; failures give their slot back
+    claimed = 0
+    changed = asyncio.Condition()
+
+    def _track_queue():
+        metrics.queue_depth = len(frontier)
+        metrics.peak_queue_depth = max(metrics.peak_queue_depth, metrics.queue_depth)
+
+    async def next_url() -> Optional[Tuple[str, int]]:
+        nonlocal claimed
+        async with changed:
+            while True:
+                if claimed < max_pages and (item := frontier.pop()) is not None:
+                    claimed += 1
+                    metrics.in_flight += 1
+                    metrics.peak_in_flight = max(
+                        metrics.peak_in_flight, metrics.in_flight
+                    )
+                    _track_queue()
+                    return item
+                # nothing queued (or the page budget is spoken for) and no fetch
+                # still running that could change that
+                if metrics.in_flight == 0 and (
+                    not len(frontier) or claimed >= max_pages
+                ):
+                    changed.notify_all()
+                    return None
+                wait = frontier.ready_in() if claimed < max_pages else None
+                try:
+                    # a politeness window may open before anyone notifies; 0.0
+                    # means one just did, only None waits for a notify alone
+                    await asyncio.wait_for(changed.wait(), timeout=wait)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def worker():
+        nonlocal claimed
+        while (item := await next_url()) is not None:
+            url, depth = item
+            try:
+                url, page = await fetch(url)
+            except Exception:
+                page = None
+            async with changed:
+                metrics.in_flight -= 1
+                if page is None:
+                    metrics.errors += 1
+                    claimed -= 1
+                elif (
+                    canonicalize_url(url) in visited
+                    or page.get("content_hash") in seen_content
+                ):
+                    # redirected onto a page we already have, or the same
+                    # content served under another URL
+                    claimed -= 1
+                else:
+                    visited.add(canonicalize_url(url))
+                    if page.get("content_hash"):
+                        seen_content.add(page["content_hash"])
+                    results.append(page)
+                    metrics.pages += 1
+                    # the frontier drops anything already enqueued, in any spelling
+                    frontier.push_many(
+                        (
+                            link
+                            for link in page["links"]["internal"]
+                            if is_same_origin(link, start_url)
+                        ),
+                        depth + 1,
+                    )
+                    _track_queue()
+                changed.notify_all()
 
-def _extract_title(html: str) -> str:
-    try:
-        soup = BeautifulSoup(html or "", "html.parser")
-        if soup.title and soup.title.string:
-            return soup.title.string.strip()
-    except Exception:
-        pass
-    return ""
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    metrics.finished_at = time.monotonic()
+    return results
 
 
 async def crawl_site(
@@ -191,129 +358,82 @@ async def crawl_site(
     max_pages: int = 50,
     concurrency: int = 5,
     cdp_endpoint: Optional[str] = None,
+    max_depth: Optional[int] = None,
+    politeness_delay: float = 0.0,
+    metrics: Optional[CrawlMetrics] = None,
+    fetcher: Union[FetcherKind, PageFetcher] = "auto",
+    cache: Optional[CrawlCache] = crawl_cache,
 ) -> List[Dict]:
-    visited: Set[str] = set()
-    queue: deque[str] = deque([start_url])
-    results: List[Dict] = []
-
-    semaphore = asyncio.Semaphore(concurrency)
-
-    # Use Playwright with CDP if endpoint provided, otherwise use crawl4ai
-    if cdp_endpoint:
-        async with async_playwright() as p:
-            browser = await p.chromium.connect_over_cdp(cdp_endpoint)
-            context = await browser.new_context()
-
-            async def fetch(url: str) -> Tuple[str, Dict]:
-                async with semaphore:
-                    page = await context.new_page()
-                    try:
-                        await page.goto(url)
-                        await page.wait_for_load_state("domcontentloaded")
-                        html = await page.content()
-                        title = await page.title()
-                        internal_links, external_links = _extract_links(html, url)
-                        page_data: Dict = {
-                            "url": url,
-                            "title": title,
-                            "markdown": "",  # No markdown generation in Playwright path
-                            "html": html,
-                            "links": {
-                                "internal": internal_links,
-                                "external": external_links,
-                            },
-                        }
-                        return url, page_data
-                    finally:
-                        await page.close()
-
-            while queue and len(visited) < max_pages:
-                batch: List[str] = []
-                while (
-                    queue
-                    and len(batch) < concurrency
-                    and len(visited) + len(batch) < max_pages
-                ):
-                    next_url = queue.popleft()
-                    if next_url in visited:
-                        continue
-                    batch.append(next_url)
-
-                if not batch:
-                    break
-
-                tasks = [asyncio.create_task(fetch(u)) for u in batch]
-                for task in asyncio.as_completed(tasks):
-                    try:
-                        url, page = await task
-                    except Exception:
-                        continue
-
-                    if url in visited:
-                        continue
-                    visited.add(url)
-                    results.append(page)
-
-                    for link in page["links"]["internal"]:
-                        if link not in visited and _is_same_origin(link, start_url):
-                            queue.append(link)
+    """
+    Crawl same-origin pages from start_url. `fetcher` picks the backend:
+    "cdp" (Playwright over cdp_endpoint), "crawl4ai", "http" (no browser) or
+    "auto" (cdp when an endpoint is given, else crawl4ai). An already started
+    PageFetcher instance is used as-is and left open. Pages come from `cache`
+    while fresh; pass cache=None to always fetch. Pages fetched through the
+    user's logged-in browser (cdp) are never cached: the cache is keyed by URL
+    alone and revalidates without the browser's cookies.
+    """
+    if isinstance(fetcher, CDPPageFetcher) or (
+        cdp_endpoint and fetcher in ("cdp", "auto")
+    ):
+        cache = None
+    frontier = CrawlFrontier(max_depth=max_depth, politeness_delay=politeness_delay)
+    frontier.push(start_url)
+    metrics = metrics or CrawlMetrics()
+
+    async def fetch(url: str) -> Tuple[str, Dict]:
+        cached = await cache.get(url) if cache else None
+        if cached is not None:
+            fetched = FetchedPage(
+                url=cached.data["url"],
+                html=cached.html,
+                markdown=cached.markdown,
+                title=cached.data["title"],
+            )
+            page_hash = cached.content_hash
+        else:
+            fetched = await page_fetcher.fetch(url)
+            page_hash = content_hash(fetched.html or fetched.markdown)
+            if cache:
+                await cache.put(
+                    url,
+                    html=fetched.html,
+                    markdown=fetched.markdown,
+                    data={"url": fetched.url, "title": fetched.title},
+                    headers=fetched.headers,
+                )
+        analysis = analyze_page(fetched.html, fetched.url)
+        page_data: Dict = {
+            "url": fetched.url,
+            "title": fetched.title if fetched.title is not None else analysis.title,
+            "markdown": fetched.markdown,
+            "html": fetched.html,
+            "links": {
+                "internal": analysis.internal_links,
+                "external": analysis.external_links,
+            },
+            "forms": analysis.forms,
+            "content_hash": page_hash,
+        }
+        return fetched.url, page_data
 
-            await context.close()
-            await browser.close()
+    if isinstance(fetcher, PageFetcher):
+        page_fetcher = fetcher
+        results = await _crawl_with_workers(
+            start_url, fetch, frontier, max_pages, concurrency, metrics
+        )
     else:
-        # Original crawl4ai implementation
-        async with AsyncWebCrawler() as crawler:
-
-            async def fetch(url: str) -> Tuple[str, Dict]:
-                async with semaphore:
-                    result = await crawler.arun(url=url, config=crawler_config)
-                    page_html = getattr(result, "cleaned_html", "") or ""
-                    page_markdown = getattr(result, "markdown", "") or ""
-                    title = _extract_title(page_html)
-                    internal_links, external_links = _extract_links(page_html, url)
-                    page_data: Dict = {
-                        "url": url,
-                        "title": title,
-                        "markdown": page_markdown,
-                        "html": page_html,
-                        "links": {
-                            "internal": internal_links,
-                            "external": external_links,
-                        },
-                    }
-                    return url, page_data
-
-            while queue and len(visited) < max_pages:
-                batch: List[str] = []
-                while (
-                    queue
-                    and len(batch) < concurrency
-                    and len(visited) + len(batch) < max_pages
-                ):
-                    next_url = queue.popleft()
-                    if next_url in visited:
-                        continue
-                    batch.append(next_url)
-
-                if not batch:
-                    break
-
-                tasks = [asyncio.create_task(fetch(u)) for u in batch]
-                for task in asyncio.as_completed(tasks):
-                    try:
-                        url, page = await task
-                    except Exception:
-                        continue
-
-                    if url in visited:
-                        continue
-                    visited.add(url)
-                    results.append(page)
-
-                    for link in page["links"]["internal"]:
-                        if link not in visited and _is_same_origin(link, start_url):
-                            queue.append(link)
+        async with make_fetcher(
+            fetcher,
+            cdp_endpoint=cdp_endpoint,
+            concurrency=concurrency,
+            crawl4ai_config=crawler_config,
+        ) as page_fetcher:
+            results = await _crawl_with_workers(
+                start_url, fetch, frontier, max_pages, concurrency, metrics
+            )
 
+    print(f"[crawl] {start_url}: {metrics.as_dict()}")
     return results
 
 
@@ -0,0 +1,205 @@
+import asyncio
+from dataclasses import dataclass, field
+from typing import Dict, List, Literal, Optional
+
+import httpx
+from crawl4ai import AsyncWebCrawler, BrowserConfig, CrawlerRunConfig
+from playwright.async_api import Browser, BrowserContext, Page, async_playwright
+
+
+@dataclass
+class FetchedPage:
+    url: str  # final URL, after redirects
+    html: str
+    markdown: str = ""
+    title: Optional[str] = None  # None when the backend can't tell cheaply
+    # response headers, for ETag / Last-Modified revalidation by the crawl cache
+    headers: Dict[str, str] = field(default_factory=dict)
+
+
+class PageFetcher:
+    """
+    One way of turning a URL into HTML for crawl_site. Use as an async context
+    manager; fetch() may be called concurrently by every crawl worker.
+    """
+
+    async def __aenter__(self) -> "PageFetcher":
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        await self.close()
+
+    async def start(self) -> None:
+        pass
+
+    async def close(self) -> None:
+        pass
+
+    async def fetch(self, url: str) -> FetchedPage:
+        raise NotImplementedError
+
+
+class CDPPageFetcher(PageFetcher):
+    """
+    Playwright over CDP, e.g. a Chrome the user is already logged into.
+    Tabs are pooled and reused across URLs instead of opened per page.
+    """
+
+    def __init__(self, cdp_endpoint: str, pool_size: int = 5):
+        self.cdp_endpoint = cdp_endpoint
+        self.pool_size = pool_size
+        self._playwright = None
+        self._browser: Optional[Browser] = None
+        self._context: Optional[BrowserContext] = None
+        # one slot per tab: a discarded tab gives its slot back, so a waiter
+        # opens a fresh one instead of waiting on an idle tab that never comes
+        self._slots = asyncio.Semaphore(pool_size)
+        self._idle: List[Page] = []
+
+    async def start(self) -> None:
+        self._playwright = await async_playwright().start()
+        self._browser = await self._playwright.chromium.connect_over_cdp(
+            self.cdp_endpoint
+        )
+        self._context = await self._browser.new_context()
+
+    async def close(self) -> None:
+        if self._context:
+            await self._context.close()
+        if self._browser:
+            await self._browser.close()
+        if self._playwright:
+            await self._playwright.stop()
+        self._idle.clear()
+        self._context = self._browser = self._playwright = None
+
+    async def _acquire(self) -> Page:
+        await self._slots.acquire()
+        if self._idle:
+            return self._idle.pop()
+        try:
+            return await self._context.new_page()  # type: ignore
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def _release(self, page: Page) -> None:
+        self._idle.append(page)
+        self._slots.release()
+
+    async def _discard(self, page: Page) -> None:
+        try:
+            await page.close()
+        except Exception:
+            pass
+        finally:
+            self._slots.release()
+
+    async def fetch(self, url: str) -> FetchedPage:
+        page = await self._acquire()
+        try:
+            response = await page.goto(url)
+            await page.wait_for_load_state("domcontentloaded")
+            fetched = FetchedPage(
+                url=page.url or url,
+                html=await page.content(),
+                title=await page.title(),
+                headers=response.headers if response else {},
+            )
+        except BaseException:
+            # a tab that failed mid-navigation may be in any state, don't reuse it
+            await self._discard(page)
+            raise
+        self._release(page)
+        return fetched
+
+
+class Crawl4AIFetcher(PageFetcher):
+    """crawl4ai's own browser; the only backend that produces markdown"""
+
+    def __init__(
+        self,
+        config: Optional[CrawlerRunConfig] = None,
+        browser_config: Optional[BrowserConfig] = None,
+    ):
+        self.config = config
+        self.browser_config = browser_config
+        self._crawler: Optional[AsyncWebCrawler] = None
+
+    async def start(self) -> None:
+        self._crawler = AsyncWebCrawler(config=self.browser_config)
+        await self._crawler.__aenter__()
+
+    async def close(self) -> None:
+        if self._crawler:
+            await self._crawler.__aexit__(None, None, None)
+            self._crawler = None
+
+    async def fetch(self, url: str) -> FetchedPage:
+        result = await self._crawler.arun(url=url, config=self.config)  # type: ignore
+        return FetchedPage(
+            url=url,
+            html=getattr(result, "cleaned_html", "") or "",
+            markdown=getattr(result, "markdown", "") or "",
+            headers=getattr(result, "response_headers", None) or {},
+        )
+
+
+class HTTPFetcher(PageFetcher):
+    """
+    Plain pooled HTTP, no browser: for static sites where nothing is rendered
+    client-side. Non-HTML responses come back with empty HTML.
+    """
+
+    def __init__(self, max_connections: int = 10, timeout: float = 20.0):
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self._client: Optional[httpx.AsyncClient] = None
+
+    async def start(self) -> None:
+        self._client = httpx.AsyncClient(
+            follow_redirects=True,
+            timeout=self.timeout,
+            limits=httpx.Limits(
+                max_connections=self.max_connections,
+                max_keepalive_connections=self.max_connections,
+            ),
+        )
+
+    async def close(self) -> None:
+        if self._client:
+            await self._client.aclose()
+            self._client = None
+
+    async def fetch(self, url: str) -> FetchedPage:
+        response = await self._client.get(url)  # type: ignore
+        response.raise_for_status()
+        content_type = response.headers.get("content-type", "")
+        html = response.text if "html" in content_type else ""
+        return FetchedPage(
+            url=str(response.url), html=html, headers=dict(response.headers)
+        )
+
+
+FetcherKind = Literal["auto", "cdp", "crawl4ai", "http"]
+
+
+def make_fetcher(
+    kind: FetcherKind = "auto",
+    cdp_endpoint: Optional[str] = None,
+    concurrency: int = 5,
+    crawl4ai_config: Optional[CrawlerRunConfig] = None,
+) -> PageFetcher:
+    """auto keeps crawl_site's old behaviour: CDP when an endpoint is given, else crawl4ai"""
+    if kind == "auto":
+        kind = "cdp" if cdp_endpoint else "crawl4ai"
+    if kind == "cdp":
+        if not cdp_endpoint:
+            raise ValueError("cdp fetcher needs a cdp_endpoint")
+        return CDPPageFetcher(cdp_endpoint, pool_size=concurrency)
+    if kind == "crawl4ai":
+        return Crawl4AIFetcher(config=crawl4ai_config)
+    if kind == "http":
+        return HTTPFetcher(max_connections=concurrency)
+    raise ValueError(f"Unknown fetcher: {kind}")
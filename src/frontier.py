@@ -0,0 +1,207 @@
+import heapq
+import itertools
+import posixpath
+import re
+import time
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+
+def canonicalize_url(url: str) -> str:
+    """
+    Normalise a URL so trivially different spellings of one page compare equal:
+    lowercase scheme/host, no default port, no fragment, resolved dot segments,
+    no duplicate or trailing slashes and query parameters in sorted order.
+    """
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+
+    netloc = (parts.hostname or "").lower()
+    if ":" in netloc:  # IPv6 literal, hostname strips its brackets
+        netloc = f"[{netloc}]"
+    try:
+        port = parts.port
+    except ValueError:
+        port = None
+    if port is not None and DEFAULT_PORTS.get(scheme) != port:
+        netloc = f"{netloc}:{port}"
+    if parts.username:
+        userinfo = parts.username
+        if parts.password:
+            userinfo = f"{userinfo}:{parts.password}"
+        netloc = f"{userinfo}@{netloc}"
+
+    path = parts.path or "/"
+    if "//" in path:
+        path = re.sub(r"/{2,}", "/", path)
+    if "/." in path:
+        path = posixpath.normpath(path)
+    elif len(path) > 1:
+        path = path.rstrip("/")
+
+    query = parts.query
+    if query:
+        query = urlencode(sorted(parse_qsl(query, keep_blank_values=True)))
+    return urlunsplit((scheme, netloc, path, query, ""))
+
+
+class CrawlFrontier:
+    """
+    URLs waiting to be crawled, shallowest first (FIFO within a depth).
+
+    Every URL is canonicalised and checked against the set of everything ever
+    enqueued on push, so duplicates never reach the queue. The canonical form
+    is only the dedup key: pop() hands out the URL as it was pushed, since
+    canonicalising can change what a server returns. With a politeness
+    delay, pop() only hands out a URL whose host hasn't been served within
+    the last `politeness_delay` seconds.
+    """
+
+    def __init__(self, max_depth: Optional[int] = None, politeness_delay: float = 0.0):
+        self.max_depth = max_depth
+        self.politeness_delay = politeness_delay
+        # (depth, push order, canonical host, url as pushed)
+        self._heap: List[Tuple[int, int, str, str]] = []
+        self._seen: Set[str] = set()
+        # exact strings already pushed; pages repeat the same hrefs (nav, footer)
+        # so most pushes are answered here without canonicalising
+        self._raw_seen: Set[str] = set()
+        self._order = itertools.count()
+        self._host_ready_at: Dict[str, float] = {}
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def __contains__(self, url: str) -> bool:
+        return canonicalize_url(url) in self._seen
+
+    @property
+    def seen_count(self) -> int:
+        return len(self._seen)
+
+    def push(self, url: str, depth: int = 0) -> bool:
+        """Enqueue url unless it (or a spelling of it) was ever enqueued before"""
+        if self.max_depth is not None and depth > self.max_depth:
+            return False
+        if url in self._raw_seen:
+            return False
+        self._raw_seen.add(url)
+        canonical = canonicalize_url(url)
+        if canonical in self._seen:
+            return False
+        self._seen.add(canonical)
+        host = urlsplit(canonical).netloc
+        heapq.heappush(self._heap, (depth, next(self._order), host, url))
+        return True
+
+    def push_many(self, urls: Iterable[str], depth: int) -> int:
+        return sum(self.push(url, depth) for url in urls)
+
+    def pop(self) -> Optional[Tuple[str, int]]:
+        """(url, depth) of the next URL that may be fetched now, else None"""
+        if not self.politeness_delay:
+            if not self._heap:
+                return None
+            depth, _, _, url = heapq.heappop(self._heap)
+            return url, depth
+
+        now = time.monotonic()
+        skipped: List[Tuple[int, int, str, str]] = []
+        found = None
+        while self._heap:
+            item = heapq.heappop(self._heap)
+            host = item[2]
+            if self._host_ready_at.get(host, 0.0) <= now:
+                self._host_ready_at[host] = now + self.politeness_delay
+                found = item
+                break
+            skipped.append(item)
+        for item in skipped:
+            heapq.heappush(self._heap, item)
+        if found is None:
+            return None
+        depth, _, _, url = found
+        return url, depth
+
+    def ready_in(self) -> Optional[float]:
+        """Seconds until pop() can return something; None once the frontier is empty"""
+        if not self._heap:
+            return None
+        if not self.politeness_delay:
+            return 0.0
+        now = time.monotonic()
+        return max(
+            0.0,
+            min(
+                self._host_ready_at.get(host, 0.0) - now for _, _, host, _ in self._heap
+            ),
+        )
+
+
+if __name__ == "__main__":
+    # Synthetic site benchmark: every page links to a handful of others, each
+    # spelled a few different ways (fragments, trailing slashes, query order).
+    # The ?a=1&b=2 variant is a genuinely different URL, so two fetches per
+    # page is the floor.
+    import random
+    from collections import deque
+
+    PAGES = 20_000
+    LINKS_PER_PAGE = 40
+    rng = random.Random(0)
+
+    def spellings(n: int) -> List[str]:
+        base = f"https://example.com/section/{n % 50}/page/{n}"
+        return [
+            base,
+            base + "/",
+            f"{base}#top",
+            f"{base}?b=2&a=1",
+            f"{base}?a=1&b=2",
+            f"HTTPS://Example.com:443/section/{n % 50}/./page/{n}",
+        ]
+
+    site = {
+        n: [rng.choice(spellings(rng.randrange(PAGES))) for _ in range(LINKS_PER_PAGE)]
+        for n in range(PAGES)
+    }
+
+    def page_id(url: str) -> int:
+        return int(urlsplit(url).path.rstrip("/").rsplit("/", 1)[-1])
+
+    # Previous approach: deque + visited check at pop time only
+    start = time.perf_counter()
+    visited: Set[str] = set()
+    queue: deque[str] = deque([spellings(0)[0]])
+    peak_queue = fetches = 0
+    while queue:
+        url = queue.popleft()
+        if url in visited:
+            continue
+        visited.add(url)
+        fetches += 1
+        for link in site[page_id(url)]:
+            if link not in visited:
+                queue.append(link)
+        peak_queue = max(peak_queue, len(queue))
+    naive = time.perf_counter() - start
+    print(
+        f"deque:    {naive:.2f}s, {fetches} fetches for {PAGES} pages, "
+        f"peak queue {peak_queue}"
+    )
+
+    start = time.perf_counter()
+    frontier = CrawlFrontier()
+    frontier.push(spellings(0)[0])
+    peak_queue = fetches = 0
+    while (item := frontier.pop()) is not None:
+        url, depth = item
+        fetches += 1
+        frontier.push_many(site[page_id(url)], depth + 1)
+        peak_queue = max(peak_queue, len(frontier))
+    print(
+        f"frontier: {time.perf_counter() - start:.2f}s, {fetches} fetches for "
+        f"{PAGES} pages, peak queue {peak_queue}"
+    )
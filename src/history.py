@@ -0,0 +1,153 @@
+import json
+import os
+import time
+from dataclasses import asdict, dataclass, field, replace
+from typing import Any, Dict, List, Optional
+
+from pydantic_ai.messages import (
+    ModelMessage,
+    ModelMessagesTypeAdapter,
+    ModelRequest,
+    SystemPromptPart,
+    UserPromptPart,
+)
+
+# rough but stable: ~4 characters per token for English text and JSON
+CHARS_PER_TOKEN = 4
+
+SUMMARY_HEADER = (
+    "Summary of the analysis so far (earlier steps are not repeated in this "
+    "conversation):\n"
+)
+
+
+def estimate_tokens(messages: List[ModelMessage]) -> int:
+    if not messages:
+        return 0
+    return len(ModelMessagesTypeAdapter.dump_json(messages)) // CHARS_PER_TOKEN
+
+
+def _split_runs(messages: List[ModelMessage]) -> List[List[ModelMessage]]:
+    """
+    Group a history into agent runs, each starting at a request that carries a
+    user prompt. Cutting only on these boundaries never separates a tool call
+    from its return, which the model APIs reject.
+    """
+    runs: List[List[ModelMessage]] = []
+    for message in messages:
+        starts_run = isinstance(message, ModelRequest) and any(
+            isinstance(part, UserPromptPart) for part in message.parts
+        )
+        if starts_run or not runs:
+            runs.append([])
+        runs[-1].append(message)
+    return runs
+
+
+@dataclass
+class StepMetrics:
+    step: int
+    url: Optional[str]
+    latency: float
+    input_tokens: int
+    output_tokens: int
+    requests: int
+    history_messages: int  # sent with this step, after compaction
+    history_tokens: int  # estimated
+    runs_dropped: int  # summarised away instead of being re-sent
+
+
+@dataclass
+class HistoryCompactor:
+    """
+    Keeps the message history passed between analysis steps bounded.
+
+    The newest agent runs are kept verbatim, up to `max_runs` and as many as
+    fit in `max_tokens` (the latest one always). Everything older is replaced
+    by a structured summary of the visited URLs, flow progress and findings so
+    far, sent as a system prompt part alongside the agent's original system
+    prompt. Without this every step re-sends the whole crawl.
+    """
+
+    max_tokens: int = int(os.getenv("ANALYSIS_HISTORY_TOKENS", "12000"))
+    max_runs: int = int(os.getenv("ANALYSIS_HISTORY_RUNS", "2"))
+    steps: List[StepMetrics] = field(default_factory=list)
+    # runs summarised away by the last compact()
+    last_dropped: int = field(default=0, init=False)
+
+    def compact(
+        self, messages: List[ModelMessage], summary: Dict[str, Any]
+    ) -> List[ModelMessage]:
+        first = messages[0] if messages else None
+        first_parts = first.parts if isinstance(first, ModelRequest) else []
+        # a previous compaction's summary request isn't a run of its own; it is
+        # superseded by the new summary, not kept or counted as dropped
+        summarised = any(
+            isinstance(part, SystemPromptPart)
+            and part.content.startswith(SUMMARY_HEADER)
+            for part in first_parts
+        )
+        runs = _split_runs(messages[1:] if summarised else messages)
+        system_parts = [
+            part
+            for part in first_parts
+            if isinstance(part, SystemPromptPart)
+            and not part.content.startswith(SUMMARY_HEADER)
+        ]
+
+        summary_part = SystemPromptPart(
+            SUMMARY_HEADER + json.dumps(summary, default=str, indent=1)
+        )
+
+        kept: List[List[ModelMessage]] = []
+        budget = self.max_tokens - estimate_tokens([ModelRequest(parts=[summary_part])])
+        for run in reversed(runs):
+            cost = estimate_tokens(run)
+            if kept and (len(kept) >= self.max_runs or cost > budget):
+                break
+            kept.insert(0, run)
+            budget -= cost
+        self.last_dropped = len(runs) - len(kept)
+        if not self.last_dropped and not summarised:
+            return messages
+
+        window: List[ModelMessage] = []
+        for run in kept:
+            for message in run:
+                if isinstance(message, ModelRequest):
+                    parts = [
+                        part
+                        for part in message.parts
+                        if not isinstance(part, SystemPromptPart)
+                    ]
+                    message = replace(message, parts=parts)
+                window.append(message)
+        return [ModelRequest(parts=[*system_parts, summary_part]), *window]
+
+    def record(
+        self,
+        url: Optional[str],
+        started: float,
+        result: Any,
+        history: List[ModelMessage],
+    ) -> StepMetrics:
+        usage = result.usage
+        if callable(usage):  # a method before pydantic-ai 2
+            usage = usage()
+        step = StepMetrics(
+            step=len(self.steps) + 1,
+            url=url,
+            latency=round(time.perf_counter() - started, 3),
+            input_tokens=getattr(usage, "input_tokens", 0) or 0,
+            output_tokens=getattr(usage, "output_tokens", 0) or 0,
+            requests=getattr(usage, "requests", 0) or 0,
+            history_messages=len(history),
+            history_tokens=estimate_tokens(history),
+            runs_dropped=self.last_dropped,
+        )
+        self.steps.append(step)
+        print(f"[history] step {step.step}: {asdict(step)}")
+        return step
+
+    def metrics(self) -> List[Dict[str, Any]]:
+        return [asdict(step) for step in self.steps]
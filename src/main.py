@@ -1,4 +1,8 @@
+import asyncio
 import json
+import time
+from collections.abc import Awaitable, Callable
+from contextlib import ExitStack
 from datetime import datetime, timedelta
 
 import logfire
@@ -15,12 +19,14 @@ from pydantic_ai import Agent
 from pydantic_ai.models.openai import OpenAIResponsesModel, OpenAIResponsesModelSettings
 
 from app.core.ws import websocket_conn_man
+from src.browser import browser_session
 from src.crawler import (
     complex_web_extraction,
     crawl_site,
     get_clean_markdown,
     take_screenshot,
 )
+from src.history import HistoryCompactor, StepMetrics
 
 model = OpenAIResponsesModel("gpt-5")
 # settings = OpenAIResponsesModelSettings(
@@ -28,6 +34,20 @@ model = OpenAIResponsesModel("gpt-5")
 #     openai_reasoning_summary="concise",
 # )
 
+# WebSocket topic that sub-agent findings are streamed on
+ANALYSIS_TOPIC = "analysis"
+
+
+async def notify(topic: str, message: str) -> None:
+    """
+    Stream an analysis event. Per-job topics go through Redis so a client
+    subscribed on any API worker gets them; the shared topic stays local.
+    """
+    if topic == ANALYSIS_TOPIC:
+        await websocket_conn_man.send_to_topic(topic, message)
+    else:
+        await websocket_conn_man.publish(topic, message)
+
 
 class BaseDep(BaseModel):
     url: str
@@ -35,6 +55,8 @@ class BaseDep(BaseModel):
     password: str
     storage_state_path: str | None = None
     cdp_endpoint: str | None = None
+    # where sub-agent findings are streamed, see notify()
+    progress_topic: str = ANALYSIS_TOPIC
     visited_urls: list[str] = []
     ux_report: list = []
     user_journey: list = []
@@ -91,7 +113,7 @@ agent = Agent(
         ANALYSIS WORKFLOW (per page):
         1. Navigate & Wait: Load the target page, wait for key elements to stabilize
         2. Extract Structure: Identify navigation, CTAs, forms, error messages, loading states
-        3. Multi-Agent Analysis:
+        3. Multi-Agent Analysis (call analyze_page once per page; it runs all of these in parallel):
         - UX Critic: friction points (confusing labels, hidden CTAs, poor contrast)
         - User Journey: flow blockers (broken links, unclear next steps, abandonment risks)
         - Expectation Gap: missing features users expect (search, filters, feedback, help)
@@ -238,24 +260,6 @@ async def get_user_credentials(ctx: RunContext[BaseDep]):
     return ctx.deps.username, ctx.deps.password
 
 
-@agent.tool()
-async def ux_critic(ctx: RunContext[BaseDep], current_page_url: str):
-    """Runs the UX Critic agent on the current page URL."""
-    print("Sending data to UX Critic agent for analysis")
-    ux_result = await ux_agent.run(
-        f"Url to visit is {current_page_url}, Analyze this website data for UX issues and provide actionable improvements",
-        deps=ctx.deps,
-    )
-    ctx.deps.visited_urls.append(current_page_url)
-    print("UX Critic agent analysis completed")
-    print("UX agent result:", ux_result)
-    ctx.deps.ux_report.append(ux_result.output)
-    await websocket_conn_man.broadcast(
-        json.dumps({"type": "ux_report", "data": ux_result.output.model_dump()})
-    )
-    return ux_result.output
-
-
 class UserJourneyAnalysis(BaseModel):
     flow_name: str
     steps_required: int
@@ -323,85 +327,208 @@ def get_all_visited_urls(ctx: RunContext[BaseDep]):
     return ctx.deps.visited_urls
 
 
-@agent.tool()
-async def user_journey_analysis(ctx: RunContext[BaseDep], current_page_url: str):
-    """Runs the User Journey Agent on the current page URL."""
-    print("Sending data to User Journey Agent for analysis")
-    journey_result = await user_journey_agent.run(
-        f"Url to visit is {current_page_url}, Analyze this website data for user journeys, flows, and abandonment risks.",
-        deps=ctx.deps,
-    )
-    ctx.deps.visited_urls.append(current_page_url)
-    print("User Journey Agent analysis completed")
-    print("User Journey agent result:", journey_result)
-    ctx.deps.user_journey.extend(journey_result.output)
-
-    await websocket_conn_man.broadcast(
-        json.dumps(
-            {
-                "type": "user_journey",
-                "data": [item.model_dump() for item in journey_result.output],
-            }
-        )
+class PageFindings(BaseModel):
+    url: str
+    ux_report: UXReport | None = None
+    user_journey: list[UserJourneyAnalysis] = []
+    expectations: list[ExpectationGap] = []
+    positive_stuff: list[str] = []
+    # sub-agent name -> error message, for the ones that failed
+    errors: dict[str, str] = {}
+    # fetch and per-sub-agent wall time in seconds
+    timings: dict[str, float] = {}
+
+
+def _page_prompt(url: str, page: dict, task: str) -> str:
+    return (
+        f"Url is {url}. The page has already been fetched, its content is below; "
+        "analyze it from this content alone.\n\n"
+        f"PAGE MARKDOWN:\n{page.get('markdown') or ''}\n\n"
+        f"PAGE LINKS:\n{json.dumps(page.get('links') or {}, default=str)}\n\n"
+        f"{task}"
     )
-    return journey_result.output
 
 
-@agent.tool()
-async def expectation_gap_analysis(ctx: RunContext[BaseDep], current_page_url: str):
-    """Runs the Expectation Gap Agent on the current page URL."""
-    print("Sending data to Expectation Gap Agent for analysis")
-    expectation_result = await expectation_agent.run(
-        f"Url to visit is {current_page_url}, Analyze this website data for missing features and unmet user expectations.",
-        deps=ctx.deps,
-    )
-    ctx.deps.visited_urls.append(current_page_url)
-    print("Expectation Gap Agent analysis completed")
-    print("Expectation Gap agent result:", expectation_result)
-    ctx.deps.expectations.extend(expectation_result.output)
-    await websocket_conn_man.broadcast(
-        json.dumps(
-            {
-                "type": "expectation_gap",
-                "data": [item.model_dump() for item in expectation_result.output],
-            }
+async def analyze_page_content(deps: BaseDep, url: str) -> PageFindings:
+    """
+    Fetch a page once and run the four UX sub-agents on that content
+    concurrently, so a page costs roughly as long as the slowest of them.
+    Each sub-agent's findings are merged into deps and broadcast as soon as
+    it finishes; one failing doesn't discard the others.
+    """
+    findings = PageFindings(url=url)
+    started = time.perf_counter()
+    page = await get_clean_markdown(url, cdp_url=deps.cdp_endpoint or "")
+    findings.timings["fetch"] = round(time.perf_counter() - started, 3)
+
+    async def ux() -> None:
+        result = await ux_agent.run(
+            _page_prompt(
+                url,
+                page,
+                "Analyze this website data for UX issues and provide actionable improvements",
+            ),
+            deps=deps,
+        )
+        findings.ux_report = result.output
+        deps.ux_report.append(result.output)
+        await notify(
+            deps.progress_topic,
+            json.dumps({"type": "ux_report", "data": result.output.model_dump()}),
         )
-    )
-    return expectation_result.output
 
+    async def journey() -> None:
+        result = await user_journey_agent.run(
+            _page_prompt(
+                url,
+                page,
+                "Analyze this website data for user journeys, flows, and abandonment risks.",
+            ),
+            deps=deps,
+        )
+        findings.user_journey = result.output
+        deps.user_journey.extend(result.output)
+        await notify(
+            deps.progress_topic,
+            json.dumps(
+                {
+                    "type": "user_journey",
+                    "data": [item.model_dump() for item in result.output],
+                }
+            ),
+        )
 
-@agent.tool()
-async def positive_ux_analysis(ctx: RunContext[BaseDep], current_page_url: str):
-    """Runs the Positive UX Agent on the current page URL."""
-    print("Sending data to Positive UX Agent for analysis")
-    positive_result = await positive_agent.run(
-        f"Url to visit is {current_page_url}, Analyze this website data for positive user experience elements and strengths.",
-        deps=ctx.deps,
-    )
-    ctx.deps.visited_urls.append(current_page_url)
-    print("Positive UX Agent analysis completed")
-    print("Positive UX agent result:", positive_result)
-    ctx.deps.positive_stuff.extend(positive_result.output)
-    await websocket_conn_man.broadcast(
-        json.dumps(
-            {
-                "type": "positive_ux",
-                "data": positive_result.output,
-            }
+    async def expectation() -> None:
+        result = await expectation_agent.run(
+            _page_prompt(
+                url,
+                page,
+                "Analyze this website data for missing features and unmet user expectations.",
+            ),
+            deps=deps,
+        )
+        findings.expectations = result.output
+        deps.expectations.extend(result.output)
+        await notify(
+            deps.progress_topic,
+            json.dumps(
+                {
+                    "type": "expectation_gap",
+                    "data": [item.model_dump() for item in result.output],
+                }
+            ),
         )
-    )
-    return positive_result.output
 
+    async def positive() -> None:
+        result = await positive_agent.run(
+            _page_prompt(
+                url,
+                page,
+                "Analyze this website data for positive user experience elements and strengths.",
+            ),
+            deps=deps,
+        )
+        findings.positive_stuff = result.output
+        deps.positive_stuff.extend(result.output)
+        await notify(
+            deps.progress_topic,
+            json.dumps({"type": "positive_ux", "data": result.output}),
+        )
+
+    async def timed(name: str, run) -> None:
+        sub_started = time.perf_counter()
+        try:
+            await run()
+        except Exception as e:
+            print(f"{name} agent failed:", e)
+            findings.errors[name] = str(e)
+        findings.timings[name] = round(time.perf_counter() - sub_started, 3)
+
+    # The MCP server drives a single tab that the orchestrator navigates too,
+    # so the concurrent sub-agents get neither it nor visit_current_page and
+    # work from the fetched content instead of racing each other on the tab
+    with ExitStack() as offline:
+        for sub_agent in (
+            ux_agent,
+            user_journey_agent,
+            expectation_agent,
+            positive_agent,
+        ):
+            offline.enter_context(sub_agent.override(toolsets=[], tools=[]))
+        await asyncio.gather(
+            timed("ux_critic", ux),
+            timed("user_journey", journey),
+            timed("expectation_gap", expectation),
+            timed("positive_ux", positive),
+        )
+    deps.visited_urls.append(url)
+    findings.timings["total"] = round(time.perf_counter() - started, 3)
+    print(f"Page analysis of {url} completed:", findings.timings)
+    return findings
 
-async def main():
-    username = "standard_user"
-    password = "secret_sauce"
-    cdp_endpoint = "http://localhost:9222"
 
-    # start time
+@agent.tool()
+async def analyze_page(ctx: RunContext[BaseDep], current_page_url: str):
+    """Runs the UX Critic, User Journey, Expectation Gap and Positive UX agents on the current page URL, all at once."""
+    print("Sending page to the UX sub-agents for analysis")
+    return await analyze_page_content(ctx.deps, current_page_url)
+
+
+class AnalysisOutcome(BaseModel):
+    output: MainAgentOutput
+    deps: BaseDep
+    # per-step latency, token usage and history size, see src.history
+    steps: list[dict] = []
+
+
+def analysis_summary(deps: BaseDep, output: MainAgentOutput) -> dict:
+    """What compacted history keeps of the earlier steps: where we've been and what we found"""
+
+    def latest(items: list, limit: int = 20) -> list:
+        return list(dict.fromkeys(items))[-limit:]
+
+    return {
+        "visited_urls": latest(deps.visited_urls, limit=100),
+        "purchase_flows": f"{output.current_purchase_flow_number}/{output.total_purchase_flows} completed",
+        "decision_points": latest(output.decision_points),
+        "forced_interactions": latest(output.forced_interactions),
+        "abandonment_risks": latest(output.abandonment_risks),
+        "ux_issues": latest(
+            [
+                f"{report.url}: {risk.issue}"
+                for report in deps.ux_report
+                for risk in [*report.risks, *report.friction_points]
+            ]
+        ),
+        "user_journeys": latest([journey.flow_name for journey in deps.user_journey]),
+        "expectation_gaps": latest([gap.missing_feature for gap in deps.expectations]),
+        "positives": latest(deps.positive_stuff),
+    }
+
+
+async def run_analysis(
+    url: str,
+    prompt: str,
+    username: str,
+    password: str,
+    cdp_endpoint: str,
+    timeout: timedelta = timedelta(minutes=2),
+    compactor: HistoryCompactor | None = None,
+    progress_topic: str = ANALYSIS_TOPIC,
+    on_step: Callable[[StepMetrics, MainAgentOutput], Awaitable[None]] | None = None,
+    deps: BaseDep | None = None,
+) -> AnalysisOutcome:
+    """
+    The orchestrator loop: analyse `url`, then keep following next_url until the
+    agent says it's done or `timeout` passes. Each continuation gets a compacted
+    history instead of every message so far. `on_step` is awaited after every
+    step with its metrics and the agent's output. Pass your own `deps` to keep
+    the findings gathered so far if the run is cancelled part way.
+    """
+    compactor = compactor or HistoryCompactor()
     start_time = datetime.now()
-    _deps_for_agent = BaseDep(
-        url="https://www.saucedemo.com",
+    deps = deps or BaseDep(
+        url=url,
         username=username,
         password=password,
         cdp_endpoint=cdp_endpoint,
@@ -410,44 +537,65 @@ async def main():
         user_journey=[],
         positive_stuff=[],
         expectations=[],
+        progress_topic=progress_topic,
     )
-    result = await agent.run(
-        """Go https://www.saucedemo.com and start the analysis of the website. FYI: This is an e-commerce site for purchasing branded merchandise.""",
-        deps=_deps_for_agent,
+    # one browser connection for every crawler tool call in this run
+    async with browser_session(cdp_endpoint) as session:
+        started = time.perf_counter()
+        result = await agent.run(
+            f"""Go to {url} and start the analysis of the website. FYI: {prompt}""",
+            deps=deps,
+        )
+        deps.visited_urls.extend(result.output.visited_urls)
+        step = compactor.record(url, started, result, [])
+        if on_step:
+            await on_step(step, result.output)
+
+        while True:
+            if result.output.should_continue:
+                print("Continuing to next page...")
+                history = compactor.compact(
+                    result.all_messages(), analysis_summary(deps, result.output)
+                )
+                # same deps throughout so every step's findings are kept
+                deps.url = result.output.next_url or url
+                session.new_step()
+                started = time.perf_counter()
+                result = await agent.run(
+                    f"""Go to {result.output.next_url} and continue the analysis. 
+                    Current progress: {result.output.current_purchase_flow_number}/{result.output.total_purchase_flows} purchase flows completed. 
+                    Visited URLs so far: {', '.join(dict.fromkeys(deps.visited_urls))}.""",
+                    deps=deps,
+                    message_history=history,
+                )
+                deps.visited_urls.extend(result.output.visited_urls)
+                step = compactor.record(deps.url, started, result, history)
+                if on_step:
+                    await on_step(step, result.output)
+
+            else:
+                print("Analysis complete.")
+                break
+            if datetime.now() - start_time > timeout:
+                print("Timeout reached, stopping analysis.")
+                break
+    return AnalysisOutcome(output=result.output, deps=deps, steps=compactor.metrics())
+
+
+async def main():
+    outcome = await run_analysis(
+        url="https://www.saucedemo.com",
+        prompt="This is an e-commerce site for purchasing branded merchandise.",
+        username="standard_user",
+        password="secret_sauce",
+        cdp_endpoint="http://localhost:9222",
     )
-    _deps_for_agent.visited_urls.extend(result.output.visited_urls)
-
-    while True:
-        if result.output.should_continue:
-            print("Continuing to next page...")
-            result = await agent.run(
-                f"""Go to {result.output.next_url} and continue the analysis. 
-                Current progress: {result.output.current_purchase_flow_number}/{result.output.total_purchase_flows} purchase flows completed. 
-                Visited URLs so far: {', '.join(_deps_for_agent.visited_urls)}.""",
-                deps=BaseDep(
-                    url=result.output.next_url or "https://www.saucedemo.com",
-                    username=username,
-                    password=password,
-                    cdp_endpoint=cdp_endpoint,
-                ),
-                message_history=result.all_messages(),
-            )
-            _deps_for_agent.visited_urls.extend(result.output.visited_urls)
-
-        else:
-            print("Analysis complete.")
-            break
-        # timeout after 2 minutes
-        if datetime.now() - start_time > timedelta(minutes=2):
-            print("Timeout reached, stopping analysis.")
-            break
-    print(result.output)
-    await websocket_conn_man.broadcast(
-        json.dumps({"type": "final_report", "data": result.output.model_dump()})
+    print(outcome.output)
+    await websocket_conn_man.send_to_topic(
+        ANALYSIS_TOPIC,
+        json.dumps({"type": "final_report", "data": outcome.output.model_dump()}),
     )
 
 
 if __name__ == "__main__":
-    import asyncio
-
     asyncio.run(main())
@@ -0,0 +1,101 @@
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+from urllib.parse import urljoin, urlparse
+
+from lxml import etree
+from lxml import html as lxml_html
+
+FORM_FIELD_TAGS = ("input", "select", "textarea", "button")
+
+
+def is_same_origin(url: str, root: str) -> bool:
+    parsed_url = urlparse(url)
+    parsed_root = urlparse(root)
+    return (
+        parsed_url.scheme in {"http", "https"}
+        and parsed_url.netloc == parsed_root.netloc
+    )
+
+
+@dataclass
+class PageAnalysis:
+    title: str = ""
+    internal_links: List[str] = field(default_factory=list)
+    external_links: List[str] = field(default_factory=list)
+    forms: List[Dict] = field(default_factory=list)
+
+
+def _parse(html: str) -> Optional[etree._Element]:
+    if not html or not html.strip():
+        return None
+    try:
+        return lxml_html.fromstring(html)
+    except ValueError:
+        # str input with an <?xml encoding=...?> declaration must go in as bytes
+        try:
+            return lxml_html.fromstring(html.encode("utf-8"))
+        except (etree.ParserError, ValueError):
+            return None
+    except etree.ParserError:
+        return None
+
+
+def _absolute(base_url: str, href: Optional[str]) -> Optional[str]:
+    try:
+        return urljoin(base_url, (href or "").strip())
+    except ValueError:
+        # malformed, e.g. an unterminated IPv6 host
+        return None
+
+
+def analyze_page(html: str, base_url: str) -> PageAnalysis:
+    """
+    Title, links (same-origin vs. external) and forms from a single lxml parse
+    and a single walk of the tree. Links keep first-seen order, without repeats.
+    """
+    analysis = PageAnalysis()
+    root = _parse(html)
+    if root is None:
+        return analysis
+
+    base = urlparse(base_url)
+    # dicts as ordered sets: O(1) membership, insertion order preserved
+    internal: Dict[str, None] = {}
+    external: Dict[str, None] = {}
+
+    for element in root.iter("title", "a", "form"):
+        tag = element.tag
+        if tag == "a":
+            href = element.get("href")
+            if href is None:
+                continue
+            absolute = _absolute(base_url, href)
+            if absolute is None:
+                continue
+            parsed = urlparse(absolute)
+            if parsed.scheme in {"http", "https"} and parsed.netloc == base.netloc:
+                internal[absolute] = None
+            else:
+                external[absolute] = None
+        elif tag == "title":
+            if not analysis.title:
+                analysis.title = (element.text_content() or "").strip()
+        else:
+            analysis.forms.append(
+                {
+                    "action": _absolute(base_url, element.get("action")),
+                    "method": (element.get("method") or "get").lower(),
+                    "fields": [
+                        {
+                            "tag": field_element.tag,
+                            "name": field_element.get("name"),
+                            "type": field_element.get("type"),
+                        }
+                        for field_element in element.iter(*FORM_FIELD_TAGS)
+                    ],
+                }
+            )
+
+    analysis.internal_links = list(internal)
+    analysis.external_links = list(external)
+    return analysis